@@ -1,6 +1,17 @@
 import io
 import struct
 
+import numpy as np
+
+# The bytes peeked at once when scanning a token of a buffered file
+TOKEN_PEEK_SIZE = 64
+
+# Kaldi writes each int32 as the size byte '\04' followed by the native int32, without any alignment
+INT32_STRUCT = struct.Struct("=bi")
+INT32_PAIR_STRUCT = struct.Struct("=bibi")
+FLOAT32_STRUCT = struct.Struct("=bf")
+INT32_DTYPE = np.dtype([("size", np.int8), ("value", np.int32)])
+
 
 def throw_on_error(ok, info=""):
     if not ok:
@@ -18,13 +29,29 @@ def expect_binary(fd):
 
 
 def read_token(fd):
-    key = ""
-    while True:
-        c = bytes.decode(fd.read(1))
-        if c == ' ' or c == '':
-            break
-        key += c
-    return None if key == '' else key.strip()
+    """
+        Read the token up to the next space (or the end of the file), the space is consumed.
+        A buffered file is scanned by peek so the token is read at once instead of byte by byte
+    """
+    if not hasattr(fd, "peek"):
+        key = b""
+        while True:
+            c = fd.read(1)
+            if c == b' ' or c == b'':
+                break
+            key += c
+    else:
+        key = b""
+        while True:
+            chunk = fd.peek(TOKEN_PEEK_SIZE)
+            if len(chunk) == 0:
+                break
+            end = chunk.find(b' ')
+            if end >= 0:
+                key += fd.read(end + 1)[:-1]
+                break
+            key += fd.read(len(chunk))
+    return None if key == b'' else bytes.decode(key).strip()
 
 
 def write_token(fd, token):
@@ -35,23 +62,77 @@ def write_binary_symbol(fd):
     fd.write(str.encode('\0B'))
 
 
+def read_exactly(fd, num_bytes):
+    data = fd.read(num_bytes)
+    throw_on_error(len(data) == num_bytes, f"Expect {num_bytes} bytes, but gets {len(data)} at the end of the file")
+    return data
+
+
 def read_int32(fd):
-    int_size = bytes.decode(fd.read(1))
-    throw_on_error(int_size == '\04', f"Expert '\\04', but gets {int_size}")
-    int_str = fd.read(4)
-    int_val = struct.unpack("i", int_str)
-    return int_val[0]
+    int_size, int_val = INT32_STRUCT.unpack_from(read_exactly(fd, INT32_STRUCT.size))
+    throw_on_error(int_size == 4, f"Expert '\\04', but gets {int_size}")
+    return int_val
+
+
+def read_int32_pair(fd):
+    """
+        Read two int32 at once, like the number of rows and columns of a matrix
+    """
+    first_size, first, second_size, second = INT32_PAIR_STRUCT.unpack_from(read_exactly(fd, INT32_PAIR_STRUCT.size))
+    throw_on_error(first_size == 4 and second_size == 4, f"Expect '\\04', but gets {first_size} and {second_size}")
+    return first, second
+
+
+def read_int32_array(fd, num_values) -> np.ndarray:
+    """
+        Read num_values int32 (each one with its size byte) in one read, return the int32 vector
+    """
+    values = np.frombuffer(read_exactly(fd, num_values * INT32_DTYPE.itemsize), dtype=INT32_DTYPE)
+    throw_on_error(np.all(values["size"] == 4), "Expect '\\04' before every int32")
+    return values["value"].copy()
+
+
+def unpack_token(buffer, offset):
+    """
+        The token at offset of the buffer (a mmap or bytes), return it and the offset after its space
+    """
+    end = buffer.find(b' ', offset, offset + TOKEN_PEEK_SIZE)
+    throw_on_error(end > offset, f"Expect a token at offset {offset}")
+    return bytes.decode(buffer[offset: end]), end + 1
+
+
+def unpack_int32(buffer, offset):
+    """
+        The int32 at offset of the buffer, return it and the offset after it
+    """
+    int_size, int_val = INT32_STRUCT.unpack_from(buffer, offset)
+    throw_on_error(int_size == 4, f"Expect '\\04', but gets {int_size}")
+    return int_val, offset + INT32_STRUCT.size
+
+
+def unpack_int32_pair(buffer, offset):
+    first_size, first, second_size, second = INT32_PAIR_STRUCT.unpack_from(buffer, offset)
+    throw_on_error(first_size == 4 and second_size == 4, f"Expect '\\04', but gets {first_size} and {second_size}")
+    return (first, second), offset + INT32_PAIR_STRUCT.size
+
+
+def read_into_array(fd, shape, dtype) -> np.ndarray:
+    """
+        Read the raw data of a (C-order) array of shape and dtype straight into a new array, without copying it
+    """
+    array = np.empty(shape, dtype=dtype)
+    if array.nbytes != 0:
+        num_bytes = fd.readinto(array.reshape(-1))
+        throw_on_error(num_bytes == array.nbytes,
+                       f"Expect {array.nbytes} bytes, but gets {num_bytes} at the end of the file")
+    return array
 
 
 def write_int32(fd, int32):
-    fd.write(str.encode('\04'))
-    int_pack = struct.pack("i", int32)
-    fd.write(int_pack)
+    fd.write(INT32_STRUCT.pack(4, int32))
 
 
 def read_float32(fd):
-    float_size = bytes.decode(fd.read(1))
-    throw_on_error(float_size == '\04', f"Expect '\\04', but gets {float_size}")
-    float_str = fd.read(4)
-    float_val = struct.unpack('f', float_str)
+    float_size, float_val = FLOAT32_STRUCT.unpack_from(read_exactly(fd, FLOAT32_STRUCT.size))
+    throw_on_error(float_size == 4, f"Expect '\\04', but gets {float_size}")
     return float_val
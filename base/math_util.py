@@ -26,6 +26,22 @@ def round_up_to_nearest_power_of_two(n):
     return n + 1
 
 
+def round_up_to_fast_fft_length(n):
+    # The smallest even number >= n without prime factors other than 2, 3 and 5,
+    # which the fft computes almost as fast as a power of two:
+    # 400 -> 400, 401 -> 432, 551 -> 576
+    assert n > 0, "Error in RoundUpToFastFftLength, n should be more than 0"
+    m = n + n % 2
+    while True:
+        k = m
+        for p in (2, 3, 5):
+            while k % p == 0:
+                k //= p
+        if k == 1:
+            return m
+        m += 2
+
+
 def main():
     n = 65
     print(round_up_to_nearest_power_of_two(n))
@@ -1,12 +1,19 @@
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Tuple, Union
 
 import numpy as np
 
 from feature.feature_fbank import FbankComputer, FbankOptions
 from feature.feature_mfcc import MfccComputer, MfccOptions
 from feature.feature_spectrogram import SpectrogramComputer, SpectrogramOptions
-from feature.feature_window import FeatureWindowFunction, compute_num_frames, extract_window
+from feature.feature_window import FeatureWindowFunction, compute_num_frames, first_sample_of_frame
+from feature.feature_window import extract_windows, extract_windows_batch, extract_log_energies
+from feature.feature_window import FrameExtractionOptions
 from feature.feature_config import OptionsParser
+from feature.feature_functions import compute_power_spectrum_matrix
+from feature.feature_resample import convert_sample_freq
+from feature.feature_workspace import FeatureWorkspace, get_buffer
+from feature.voice_activity_detection import VadEnergyOptions, compute_vad_from_log_energy
 
 FeatureComputer = Union[FbankComputer, MfccComputer, SpectrogramComputer]
 FeatureOptions = Union[FbankOptions, MfccOptions, SpectrogramOptions]
@@ -36,41 +43,608 @@ def build_feature_options(feature_type, option_parser: OptionsParser) -> Feature
     return options
 
 
+def split_features(features: np.ndarray, frame_offsets: np.ndarray) -> List[np.ndarray]:
+    """
+        Split the stacked features by the frame_offsets, the empty ones are np.array([]) as `FeatureExtractor.compute`
+    """
+    return [features[begin: end] if end > begin else np.array([])
+            for begin, end in zip(frame_offsets[:-1], frame_offsets[1:])]
+
+
+class ChannelOptions(object):
+    """
+        How to compute a multi-channel wave, a (num_channels, num_samples) matrix:
+            - select: the features of the channel-th channel
+            - average: the features of the average of the channels
+            - all: the (num_channels, num_frames, dim) features of all the channels
+        A 1-D wave is always computed as it is
+    """
+    CHANNEL_MODES = ["select", "average", "all"]
+
+    def __init__(self,
+                 mode="select",
+                 channel=0):
+        self.mode = mode
+        self.channel = channel
+
+    def register(self, option_parser: OptionsParser):
+        self.mode = option_parser.get("channel_mode", "select", type_function=np.str)
+        self.channel = option_parser.get("channel", 0, type_function=np.int)
+        if self.mode not in self.CHANNEL_MODES:
+            raise ValueError(f"Unknown channel_mode = {self.mode}, should be one of {self.CHANNEL_MODES}")
+
+    def is_stacked(self, wave: np.ndarray) -> bool:
+        return wave.ndim == 2 and self.mode == "all"
+
+    def select_channels(self, wave: np.ndarray) -> List[np.ndarray]:
+        """
+            The 1-D waves to compute for the wave, more than one only if `is_stacked`
+        """
+        if wave.ndim == 1:
+            return [wave]
+        if self.mode == "all":
+            return list(wave)
+        if self.mode == "average":
+            return [wave.mean(axis=0)]
+        if not 0 <= self.channel < wave.shape[0]:
+            raise ValueError(f"channel = {self.channel} is out of range for a wave of {wave.shape[0]} channels")
+        return [wave[self.channel]]
+
+
+def split_channels(waves: List[np.ndarray], channel_opts: ChannelOptions) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+        Select the 1-D waves to compute for each wave, the ones of the i-th wave are
+        [channel_offsets[i], channel_offsets[i + 1]) of the returned waves
+    """
+    channel_waves = [channel_opts.select_channels(wave) for wave in waves]
+    channel_offsets = np.concatenate([[0], np.cumsum([len(channels) for channels in channel_waves], dtype=np.int64)])
+    return [channel for channels in channel_waves for channel in channels], channel_offsets
+
+
+def split_channel_features(features: np.ndarray,
+                           frame_offsets: np.ndarray,
+                           waves: List[np.ndarray],
+                           channel_offsets: np.ndarray,
+                           channel_opts: ChannelOptions) -> List[np.ndarray]:
+    """
+        Split the stacked features of the waves from `split_channels` like `split_features`,
+        the channels of a stacked multi-channel wave have the same number of frames and are adjacent,
+        so their features are a (num_channels, num_frames, dim) view
+    """
+    # the frames of the i-th wave are [frame_offsets[channel_offsets[i]], frame_offsets[channel_offsets[i + 1]])
+    outputs = split_features(features, frame_offsets[channel_offsets])
+    for i, (wave, first, last) in enumerate(zip(waves, channel_offsets[:-1], channel_offsets[1:])):
+        if outputs[i].shape[0] != 0 and channel_opts.is_stacked(wave):
+            outputs[i] = outputs[i].reshape(last - first, outputs[i].shape[0] // (last - first), -1)
+    return outputs
+
+
+def compute_raw_log_energy(wave: np.ndarray,
+                           frame_opts: FrameExtractionOptions,
+                           channel_opts: ChannelOptions,
+                           workspace: FeatureWorkspace = None) -> np.ndarray:
+    """
+        The raw log energy (before the window function) of each frame of the wave,
+        (num_channels, num_frames) for a stacked multi-channel wave, empty if the wave has no frames
+    """
+    log_energies = list()
+    for channel in channel_opts.select_channels(wave):
+        if compute_num_frames(channel.shape[0], frame_opts) == 0:
+            return np.array([])
+        # each channel is copied out of the buffer before the next one overwrites it
+        log_energies.append(extract_log_energies(channel, frame_opts, workspace=workspace))
+    return np.stack(log_energies) if channel_opts.is_stacked(wave) else log_energies[0]
+
+
+class BlockParallelOptions(object):
+    """
+        Split the waves longer than min_duration (seconds) into num_workers blocks of frames
+        and compute the blocks on a thread pool (or a process pool if use_processes)
+    """
+
+    def __init__(self,
+                 num_workers=1,
+                 min_duration=600.0,
+                 use_processes=False):
+        self.num_workers = num_workers
+        self.min_duration = min_duration
+        self.use_processes = use_processes
+
+    def register(self, option_parser: OptionsParser):
+        self.num_workers = option_parser.get("block_num_workers", 1, type_function=np.int)
+        self.min_duration = option_parser.get("block_min_duration", 600.0, type_function=np.float)
+        self.use_processes = option_parser.get("block_use_processes", "False", type_function=np.bool)
+
+
+def split_frame_blocks(num_samples, num_frames, frame_opts: FrameExtractionOptions,
+                       num_blocks) -> List[Tuple[int, int, int, int]]:
+    """
+        Split the num_frames frames of a wave of num_samples into at most num_blocks blocks,
+        (first_frame, block_frames, begin, end) for each one, whose frames only use the samples [begin, end)
+    """
+    frame_length = frame_opts.get_win_size()
+    num_blocks = min(num_blocks, num_frames)
+    frame_bounds = [num_frames * i // num_blocks for i in range(num_blocks + 1)]
+
+    blocks = list()
+    for first_frame, end_frame in zip(frame_bounds[:-1], frame_bounds[1:]):
+        # one more frame_length on the left keeps the samples reflected at the end of the wave
+        begin = max(first_sample_of_frame(first_frame, frame_opts) - frame_length, 0)
+        end = min(first_sample_of_frame(end_frame - 1, frame_opts) + frame_length, num_samples)
+        blocks.append((first_frame, end_frame - first_frame, begin, end))
+    return blocks
+
+
+def _compute_block(extractor, wave_block: np.ndarray, first_frame, num_frames, sample_offset, num_samples):
+    # the blocks run at the same time, so they cannot share the workspace of the extractor
+    return extractor.compute_frames(wave_block, first_frame, num_frames, sample_offset, num_samples,
+                                    use_workspace=False)
+
+
+def _compute_fused_block(fused, group, wave_block: np.ndarray, first_frame, num_frames, sample_offset, num_samples,
+                         compute_log_energy=False):
+    # the blocks run at the same time, so they cannot share the workspaces of the extractors
+    return fused.compute_group_frames(group, wave_block, first_frame, num_frames, sample_offset, num_samples,
+                                      use_workspace=False, compute_log_energy=compute_log_energy)
+
+
 class FeatureExtractor(object):
 
-    def __init__(self, feature_type, option_parser: OptionsParser):
+    def __init__(self, feature_type, option_parser: OptionsParser, batch_compute=True, return_views=False):
+        """
+            batch_compute: use `compute_matrix` of the feature computer to compute all the frames at once,
+                otherwise call `compute` frame by frame
+            return_views: every stage writes to the buffers of a workspace kept across the calls,
+                which grow to the largest utterance seen so far.
+                If True the features returned are views of the workspace and are overwritten by the next call,
+                otherwise they are copies owned by the caller
+        """
         self.feature_type = feature_type
         self.feature_options = build_feature_options(feature_type, option_parser)
         self.feature_computer = build_feature_computer(feature_type, self.feature_options)
         self.window_function = FeatureWindowFunction(self.feature_options.get_frame_options())
+        self.batch_compute = batch_compute
+        self.return_views = return_views
+        self.workspace = FeatureWorkspace()
+        self.block_opts = BlockParallelOptions()
+        self.block_opts.register(option_parser)
+        self.block_executor = None
+        self.channel_opts = ChannelOptions()
+        self.channel_opts.register(option_parser)
+
+    def __getstate__(self):
+        # the executor cannot be sent to the worker processes
+        state = self.__dict__.copy()
+        state["block_executor"] = None
+        state["workspace"] = FeatureWorkspace()
+        return state
+
+    def __del__(self):
+        if getattr(self, "block_executor", None) is not None:
+            self.block_executor.shutdown(wait=False)
 
     def compute_features(self,
                          wave: np.ndarray,
                          sample_freq) -> np.ndarray:
-        # TODO: use the downsample
-        assert sample_freq == self.feature_computer.get_frame_extraction_options().samp_freq
-        return self.compute(wave)
+        """
+            Compute the features of the wave of sample_freq, which is resampled to samp_freq if it differs
+            and the frame options allow it (allow_downsample, allow_upsample)
+        """
+        frame_opts = self.feature_computer.get_frame_extraction_options()
+        return self.compute(convert_sample_freq(wave, sample_freq, frame_opts))
 
     def compute(self, wave: np.ndarray) -> np.ndarray:
+        """
+            Compute the features of a 1-D wave, or a multi-channel wave as the channel options say
+        """
+        if wave.ndim == 2:
+            if self.channel_opts.is_stacked(wave):
+                # all the channels are framed and computed together
+                return self.compute_batch([wave])[0]
+            return self.compute(self.channel_opts.select_channels(wave)[0])
+
         rows_out = compute_num_frames(wave.shape[0], self.feature_computer.get_frame_extraction_options())
-        cols_out = self.feature_computer.dim()
 
         if rows_out == 0:
             return np.array([])
 
-        output = np.zeros((rows_out, cols_out))
+        if self.use_blocks(wave.shape[0]):
+            return self.compute_blocks(wave, rows_out)
+        return self._output(self.compute_frames(wave, 0, rows_out))
+
+    def use_blocks(self, num_samples) -> bool:
+        """
+            Whether a wave of num_samples is long enough to be split into blocks of frames
+        """
+        frame_opts = self.feature_computer.get_frame_extraction_options()
+        return self.block_opts.num_workers > 1 and num_samples >= self.block_opts.min_duration * frame_opts.samp_freq
+
+    def get_block_executor(self):
+        if self.block_executor is None:
+            executor_class = ProcessPoolExecutor if self.block_opts.use_processes else ThreadPoolExecutor
+            self.block_executor = executor_class(max_workers=self.block_opts.num_workers)
+        return self.block_executor
+
+    def compute_blocks(self, wave: np.ndarray, rows_out) -> np.ndarray:
+        """
+            Split the frames into num_workers blocks, each one is computed from the samples it covers
+            and the blocks are concatenated, which gives the same frames as the serial computation
+        """
+        frame_opts = self.feature_computer.get_frame_extraction_options()
+        num_samples = wave.shape[0]
+        futures = [self.get_block_executor().submit(_compute_block, self, wave[begin: end],
+                                                    first_frame, block_frames, begin, num_samples)
+                   for first_frame, block_frames, begin, end in split_frame_blocks(num_samples, rows_out, frame_opts,
+                                                                                   self.block_opts.num_workers)]
+        return np.concatenate([future.result() for future in futures])
+
+    def compute_frames(self,
+                       wave: np.ndarray,
+                       first_frame,
+                       num_frames,
+                       sample_offset=0,
+                       num_samples=None,
+                       use_workspace=True) -> np.ndarray:
+        """
+            Compute the features of the frames [first_frame, first_frame + num_frames),
+            the wave holds the samples starting at sample_offset of the whole wave of length num_samples,
+            see `extract_windows`.
+            The result is a view of the workspace if use_workspace
+        """
+        workspace = self.workspace if use_workspace else None
         use_raw_log_energy = self.feature_computer.need_raw_log_energy()
-        for r in range(rows_out):
-            raw_log_energy = 0.0
-            if use_raw_log_energy:
-                window, raw_log_energy = extract_window(0, wave, r,
-                                                        self.feature_computer.get_frame_extraction_options(),
-                                                        self.window_function, raw_log_energy)
-            else:
-                window, raw_log_energy = extract_window(0, wave, r,
-                                                        self.feature_computer.get_frame_extraction_options(),
-                                                        self.window_function, None)
-                raw_log_energy = 0.0
+        windows, raw_log_energies = extract_windows(wave,
+                                                    self.feature_computer.get_frame_extraction_options(),
+                                                    self.window_function,
+                                                    use_raw_log_energy,
+                                                    sample_offset,
+                                                    first_frame,
+                                                    num_frames,
+                                                    num_samples,
+                                                    workspace)
+        return self._compute_windows(windows, raw_log_energies, workspace)
+
+    def compute_batch_features(self,
+                               waves: List[np.ndarray],
+                               sample_freqs: List) -> List[np.ndarray]:
+        frame_opts = self.feature_computer.get_frame_extraction_options()
+        return self.compute_batch([convert_sample_freq(wave, sample_freq, frame_opts)
+                                   for wave, sample_freq in zip(waves, sample_freqs)])
+
+    def compute_batch(self, waves: List[np.ndarray]) -> List[np.ndarray]:
+        """
+            Compute the features of several waves at once, which saves the per-call overhead for short waves,
+            the frames of all the waves go through the fft, mel and dct together,
+            the channels of the multi-channel waves are selected or stacked as `compute`
+        """
+        channel_waves, channel_offsets = split_channels(waves, self.channel_opts)
+        windows, raw_log_energies, frame_offsets = extract_windows_batch(
+            channel_waves,
+            self.feature_computer.get_frame_extraction_options(),
+            self.window_function,
+            self.feature_computer.need_raw_log_energy(),
+            self.workspace)
+        features = self._compute_windows(windows, raw_log_energies, self.workspace)
+        return split_channel_features(self._output(features), frame_offsets, waves, channel_offsets, self.channel_opts)
+
+    def compute_raw_log_energy(self, wave: np.ndarray) -> np.ndarray:
+        """
+            The raw log energy (before the window function) of each frame of the wave,
+            (num_channels, num_frames) for a stacked multi-channel wave as `compute`
+        """
+        return compute_raw_log_energy(wave, self.feature_computer.get_frame_extraction_options(), self.channel_opts,
+                                      self.workspace)
+
+    def compute_vad(self, vad_opts: VadEnergyOptions, features: np.ndarray, raw_log_energy: np.ndarray = None):
+        """
+            The energy vad of the features computed by this extractor, so they are not read again from the disk,
+            from the log energy in the column 0 of the features if they have it, otherwise from raw_log_energy,
+            the raw log energy of the same frames, see `FusedFeatureExtractor.compute_batch` with return_log_energy
+        """
+        if features.size == 0:
+            return np.array([])
+        if self.feature_computer.has_log_energy():
+            log_energy = features[..., 0]
+        elif raw_log_energy is None:
+            raise ValueError(f"The {self.feature_type} features have no log energy column, "
+                             f"the vad needs the raw log energy of their frames")
+        else:
+            log_energy = raw_log_energy
+        if log_energy.ndim == 2:
+            return np.stack([compute_vad_from_log_energy(vad_opts, channel_energy) for channel_energy in log_energy])
+        return compute_vad_from_log_energy(vad_opts, log_energy)
+
+    def _compute_windows(self,
+                         windows: np.ndarray,
+                         raw_log_energies: np.ndarray = None,
+                         workspace: FeatureWorkspace = None) -> np.ndarray:
+        num_frames = windows.shape[0]
+        if raw_log_energies is None:
+            raw_log_energies = np.zeros((num_frames,), dtype=windows.dtype)
+
+        if self.batch_compute:
+            return self.feature_computer.compute_matrix(raw_log_energies, windows, workspace=workspace)
 
-            output[r, :] = self.feature_computer.compute(raw_log_energy, window)
+        output = get_buffer(workspace, "features", num_frames, self.feature_computer.dim(), windows.dtype)
+        for r in range(num_frames):
+            output[r, :] = self.feature_computer.compute(raw_log_energies[r], windows[r])
         return output
+
+    def _output(self, features: np.ndarray) -> np.ndarray:
+        return features if self.return_views else features.copy()
+
+
+class EnergyExtractor(object):
+
+    def __init__(self, option_parser: OptionsParser):
+        """
+            Only the raw log energy of each frame, as `FeatureExtractor.compute_raw_log_energy`,
+            the frames are not windowed and the fft, mel and dct stages are skipped,
+            which is all the energy vad needs.
+            The frame options and the channel options are read from the same config as the features
+        """
+        self.frame_opts = FrameExtractionOptions()
+        self.frame_opts.register(option_parser)
+        self.channel_opts = ChannelOptions()
+        self.channel_opts.register(option_parser)
+        self.workspace = FeatureWorkspace()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["workspace"] = FeatureWorkspace()
+        return state
+
+    def compute_features(self,
+                         wave: np.ndarray,
+                         sample_freq) -> np.ndarray:
+        """
+            The log energy of the wave of sample_freq, resampled to samp_freq as `FeatureExtractor.compute_features`
+        """
+        return self.compute(convert_sample_freq(wave, sample_freq, self.frame_opts))
+
+    def compute(self, wave: np.ndarray) -> np.ndarray:
+        """
+            The (num_frames,) log energy of the wave, (num_channels, num_frames) for a stacked multi-channel wave
+        """
+        return compute_raw_log_energy(wave, self.frame_opts, self.channel_opts, self.workspace)
+
+
+class OnlineFeatureExtractor(object):
+    """
+        Compute the features of a wave given chunk by chunk,
+        only the samples needed by the frames not computed yet are kept,
+        and the concatenation of the outputs of `accept_waveform` and `flush` equals `FeatureExtractor.compute`
+    """
+
+    def __init__(self, feature_type, option_parser: OptionsParser, return_views=False):
+        self.extractor = FeatureExtractor(feature_type, option_parser, return_views=return_views)
+        self.frame_opts = self.extractor.feature_computer.get_frame_extraction_options()
+        self.waveform_remainder = np.zeros((0,))
+        self.waveform_offset = 0
+        self.num_frames_computed = 0
+
+    def reset(self):
+        self.waveform_remainder = np.zeros((0,))
+        self.waveform_offset = 0
+        self.num_frames_computed = 0
+
+    def num_samples_received(self):
+        return self.waveform_offset + self.waveform_remainder.shape[0]
+
+    def accept_waveform(self, wave: np.ndarray) -> np.ndarray:
+        """
+            Append the wave chunk and return the features of the frames which are newly complete
+        """
+        self.waveform_remainder = np.concatenate([self.waveform_remainder, wave])
+        num_frames_ready = compute_num_frames(self.num_samples_received(), self.frame_opts, flush=False)
+        features = self._compute(num_frames_ready, self.num_samples_received())
+
+        # discard the samples which will not be used by the following frames
+        first_sample = max(first_sample_of_frame(self.num_frames_computed, self.frame_opts), 0)
+        num_discard = min(first_sample - self.waveform_offset, self.waveform_remainder.shape[0])
+        if num_discard > 0:
+            self.waveform_remainder = self.waveform_remainder[num_discard:].copy()
+            self.waveform_offset += num_discard
+        return features
+
+    def flush(self) -> np.ndarray:
+        """
+            The input is finished, return the features of the remaining frames at the end of the wave
+        """
+        num_frames = compute_num_frames(self.num_samples_received(), self.frame_opts, flush=True)
+        return self._compute(num_frames, self.num_samples_received())
+
+    def _compute(self, num_frames, num_samples) -> np.ndarray:
+        num_new_frames = num_frames - self.num_frames_computed
+        if num_new_frames <= 0:
+            return np.zeros((0, self.extractor.feature_computer.dim()), dtype=self.frame_opts.get_dtype())
+        features = self.extractor.compute_frames(self.waveform_remainder,
+                                                 self.num_frames_computed,
+                                                 num_new_frames,
+                                                 self.waveform_offset,
+                                                 num_samples)
+        self.num_frames_computed = num_frames
+        return self.extractor._output(features)
+
+
+class FusedFeatureExtractor(object):
+    """
+        Compute several features (different feature types, or several configs of one type) of the same wave,
+        the extractors with the same frame options share the framing and the power spectrum,
+        which are kept in the workspace of the first extractor of the group, see `FeatureExtractor` for return_views
+    """
+
+    def __init__(self, feature_configs: List[Tuple[str, OptionsParser]], return_views=False):
+        self.extractors = [FeatureExtractor(feature_type, option_parser, return_views=return_views)
+                           for feature_type, option_parser in feature_configs]
+
+        # groups of the extractor indices with the same frame options and channel options
+        self.groups: List[List[int]] = list()
+        for i, extractor in enumerate(self.extractors):
+            frame_opts = extractor.feature_computer.get_frame_extraction_options()
+            for group in self.groups:
+                first = self.extractors[group[0]]
+                if vars(first.feature_computer.get_frame_extraction_options()) == vars(frame_opts) \
+                        and vars(first.channel_opts) == vars(extractor.channel_opts):
+                    group.append(i)
+                    break
+            else:
+                self.groups.append([i])
+
+    def __len__(self):
+        return len(self.extractors)
+
+    def compute_features(self,
+                         wave: np.ndarray,
+                         sample_freq) -> List[np.ndarray]:
+        return self.compute(wave, sample_freq)
+
+    def compute(self, wave: np.ndarray, sample_freq=None) -> List[np.ndarray]:
+        """
+            Compute the features of the wave, which is resampled for each group
+            if sample_freq is given and differs from samp_freq of the group
+        """
+        # the channels of a multi-channel wave are selected or stacked by the batch computation
+        return self.compute_batch([wave], None if sample_freq is None else [sample_freq])[0]
+
+    def compute_batch_features(self,
+                               waves: List[np.ndarray],
+                               sample_freqs: List,
+                               return_log_energy=False):
+        return self.compute_batch(waves, sample_freqs, return_log_energy)
+
+    def compute_batch(self, waves: List[np.ndarray], sample_freqs: List = None, return_log_energy=False):
+        """
+            Compute the features of several waves at once,
+            outputs[j][i] is the feature of the i-th extractor for the j-th wave,
+            the waves are resampled as `compute` if sample_freqs is given.
+            If return_log_energy, also return the raw log energy of the frames of the first extractor for each wave,
+            (num_frames,) or (num_channels, num_frames) like its features, which `FeatureExtractor.compute_vad` needs
+            when the features have no log energy column, it is taken from the framing instead of framing again
+            (and is empty if the features have the column)
+        """
+        outputs: List[List[np.ndarray]] = [[np.array([])] * len(self.extractors) for _ in waves]
+        log_energies: List[np.ndarray] = [np.array([])] * len(waves)
+        for group in self.groups:
+            first = self.extractors[group[0]]
+            frame_opts = first.feature_computer.get_frame_extraction_options()
+            group_waves = waves if sample_freqs is None else [convert_sample_freq(wave, sample_freq, frame_opts)
+                                                              for wave, sample_freq in zip(waves, sample_freqs)]
+            # the first extractor is always the first one of the first group
+            compute_log_energy = return_log_energy and group[0] == 0 and not first.feature_computer.has_log_energy()
+
+            # the long waves are split into blocks of frames as `FeatureExtractor.compute`, the others are batched
+            batch_indices = list()
+            for j, wave in enumerate(group_waves):
+                if not first.channel_opts.is_stacked(wave) and first.use_blocks(wave.shape[-1]):
+                    features, log_energy = self.compute_group_blocks(group, first.channel_opts.select_channels(wave)[0],
+                                                                     compute_log_energy)
+                    for i, feature in zip(group, features):
+                        outputs[j][i] = feature
+                    if compute_log_energy:
+                        log_energies[j] = log_energy
+                else:
+                    batch_indices.append(j)
+            if len(batch_indices) == 0:
+                continue
+
+            batch_waves = [group_waves[j] for j in batch_indices]
+            channel_waves, channel_offsets = split_channels(batch_waves, first.channel_opts)
+            use_raw_log_energy = compute_log_energy or any(self.extractors[i].feature_computer.need_raw_log_energy()
+                                                           for i in group)
+            windows, raw_log_energies, frame_offsets = extract_windows_batch(channel_waves, frame_opts,
+                                                                             first.window_function,
+                                                                             use_raw_log_energy,
+                                                                             first.workspace)
+
+            for i, features in zip(group, self._compute_group_windows(group, windows, raw_log_energies)):
+                features = self.extractors[i]._output(features)
+                for j, feature in zip(batch_indices, split_channel_features(features, frame_offsets, batch_waves,
+                                                                            channel_offsets, first.channel_opts)):
+                    outputs[j][i] = feature
+            if compute_log_energy:
+                # split as a single column of features
+                for j, log_energy in zip(batch_indices, split_channel_features(raw_log_energies[:, None],
+                                                                               frame_offsets, batch_waves,
+                                                                               channel_offsets, first.channel_opts)):
+                    log_energies[j] = log_energy[..., 0] if log_energy.size != 0 else log_energy
+        if return_log_energy:
+            return outputs, log_energies
+        return outputs
+
+    def compute_group_blocks(self,
+                             group: List[int],
+                             wave: np.ndarray,
+                             compute_log_energy=False) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+            The features of the 1-D wave for each extractor of the group, computed in blocks of frames
+            on the block workers of the first extractor of the group, see `FeatureExtractor.compute_blocks`,
+            and the raw log energy of the frames (None if compute_log_energy is False)
+        """
+        first = self.extractors[group[0]]
+        frame_opts = first.feature_computer.get_frame_extraction_options()
+        num_samples = wave.shape[0]
+        futures = [first.get_block_executor().submit(_compute_fused_block, self, group, wave[begin: end],
+                                                     first_frame, block_frames, begin, num_samples, compute_log_energy)
+                   for first_frame, block_frames, begin, end in split_frame_blocks(
+                       num_samples, compute_num_frames(num_samples, frame_opts), frame_opts,
+                       first.block_opts.num_workers)]
+        blocks = [future.result() for future in futures]
+        features = [np.concatenate(block_features) for block_features in zip(*[block[0] for block in blocks])]
+        log_energy = np.concatenate([block[1] for block in blocks]) if compute_log_energy else None
+        return features, log_energy
+
+    def compute_group_frames(self,
+                             group: List[int],
+                             wave: np.ndarray,
+                             first_frame,
+                             num_frames,
+                             sample_offset=0,
+                             num_samples=None,
+                             use_workspace=True,
+                             compute_log_energy=False) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+            The features of the frames [first_frame, first_frame + num_frames) for each extractor of the group,
+            see `FeatureExtractor.compute_frames`,
+            and the raw log energy of the frames (None if neither compute_log_energy nor the extractors need it)
+        """
+        first = self.extractors[group[0]]
+        use_raw_log_energy = compute_log_energy or any(self.extractors[i].feature_computer.need_raw_log_energy()
+                                                       for i in group)
+        windows, raw_log_energies = extract_windows(wave,
+                                                    first.feature_computer.get_frame_extraction_options(),
+                                                    first.window_function,
+                                                    use_raw_log_energy,
+                                                    sample_offset,
+                                                    first_frame,
+                                                    num_frames,
+                                                    num_samples,
+                                                    first.workspace if use_workspace else None)
+        return self._compute_group_windows(group, windows, raw_log_energies, use_workspace), raw_log_energies
+
+    def _compute_group_windows(self,
+                               group: List[int],
+                               windows: np.ndarray,
+                               raw_log_energies: np.ndarray = None,
+                               use_workspace=True) -> List[np.ndarray]:
+        first = self.extractors[group[0]]
+        power_spectrum = self._compute_power_spectrum(first, windows, use_workspace)
+        zero_log_energies = np.zeros((windows.shape[0],), dtype=windows.dtype)
+
+        features = list()
+        for i in group:
+            extractor = self.extractors[i]
+            computer = extractor.feature_computer
+            log_energies = raw_log_energies if computer.need_raw_log_energy() else zero_log_energies
+            features.append(computer.compute_matrix(log_energies, windows, power_spectrum,
+                                                    extractor.workspace if use_workspace else None))
+        return features
+
+    @staticmethod
+    def _compute_power_spectrum(extractor: FeatureExtractor, windows: np.ndarray, use_workspace=True) -> np.ndarray:
+        frame_opts = extractor.feature_computer.get_frame_extraction_options()
+        out = None
+        if use_workspace:
+            out = extractor.workspace.get("power_spectrum", windows.shape[0], windows.shape[1] // 2 + 1,
+                                          windows.dtype)
+        return compute_power_spectrum_matrix(windows, frame_opts.get_fft_backend(), out)
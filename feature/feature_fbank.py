@@ -9,6 +9,8 @@ from feature.feature_window import FrameExtractionOptions
 from feature.mel_computations import MelBanksOptions, MelBanks
 from feature.feature_config import OptionsParser
 from base.math_util import epsilon, numeric_limits_float_min
+from feature.feature_functions import compute_power_spectrum_matrix, compute_log_energy_matrix
+from feature.feature_workspace import FeatureWorkspace, get_buffer
 
 
 class FbankOptions(object):
@@ -21,8 +23,8 @@ class FbankOptions(object):
                  raw_energy=True,
                  use_log_fbank=True,
                  use_power=True):
-        self.mel_opts = mel_opts
-        self.frame_opts = frame_opts
+        self.mel_opts = mel_opts if mel_opts is not None else MelBanksOptions()
+        self.frame_opts = frame_opts if frame_opts is not None else FrameExtractionOptions()
 
         self.use_energy = use_energy
         self.energy_floor = energy_floor
@@ -52,6 +54,7 @@ class FbankComputer(object):
         self.log_energy_floor = np.log(opts.energy_floor)
         self.mel_bank = None
         self.get_mel_banks()
+        self.fft_backend = opts.frame_opts.get_fft_backend()
 
     def dim(self):
         return self.opts.mel_opts.num_bins + (1 if self.opts.use_energy else 0)
@@ -59,6 +62,10 @@ class FbankComputer(object):
     def get_frame_extraction_options(self):
         return self.opts.frame_opts
 
+    def has_log_energy(self):
+        # the column 0 of the features is the log energy
+        return self.opts.use_energy
+
     def need_raw_log_energy(self):
         return self.opts.use_energy and self.opts.raw_energy
 
@@ -72,11 +79,7 @@ class FbankComputer(object):
         if self.opts.use_energy and not self.opts.raw_energy:
             signal_log_energy = np.log(max(np.dot(signal_frame, signal_frame), numeric_limits_float_min()))
 
-        signal_frame = np.fft.fft(signal_frame)
-        signal_frame = np.abs(signal_frame) ** 2
-
-        signal_frame_dim = signal_frame.shape[0]
-        power_spectrum = signal_frame[:signal_frame_dim // 2 + 1]
+        power_spectrum = compute_power_spectrum_matrix(signal_frame[None, :], self.fft_backend)[0]
 
         if not self.opts.use_power:
             power_spectrum = np.power(power_spectrum, 0.5)
@@ -84,18 +87,61 @@ class FbankComputer(object):
         # mel_offset = 1 if self.opts.use_energy else 0
         mel_energies = mel_banks.compute(power_spectrum)
         if self.opts.use_log_fbank:
-            mel_energies = np.max(mel_energies, epsilon())
+            mel_energies = np.maximum(mel_energies, epsilon())
             mel_energies = np.log(mel_energies)
 
         if self.opts.use_energy:
             if self.opts.energy_floor > 0.0 and signal_log_energy < self.log_energy_floor:
                 signal_log_energy = self.log_energy_floor
-            feature = np.concatenate([np.array(signal_log_energy), mel_energies])
+            feature = np.concatenate([np.array([signal_log_energy]), mel_energies])
         else:
             feature = mel_energies
 
         return feature
 
+    def compute_matrix(self,
+                       signal_log_energies: np.ndarray,
+                       signal_frames: np.ndarray,
+                       power_spectrum: np.ndarray = None,
+                       workspace: FeatureWorkspace = None) -> np.ndarray:
+        """
+            Compute the features for all the frames of an utterance,
+            signal_frames is a (num_frames, padded_window_size) matrix,
+            power_spectrum can be given if it is already computed from the signal_frames, it is not modified,
+            the intermediate matrices and the result are views of the workspace buffers if workspace is given
+        """
+        assert signal_frames.shape[1] == self.opts.frame_opts.get_padded_window_size()
+        num_frames = signal_frames.shape[0]
+        num_fft_bins = signal_frames.shape[1] // 2 + 1
+        dtype = signal_frames.dtype
+
+        if self.opts.use_energy and not self.opts.raw_energy:
+            signal_log_energies = compute_log_energy_matrix(signal_frames)
+
+        if power_spectrum is None:
+            power_spectrum = compute_power_spectrum_matrix(
+                signal_frames, self.fft_backend,
+                out=get_buffer(workspace, "power_spectrum", num_frames, num_fft_bins, dtype))
+
+        if not self.opts.use_power:
+            power_spectrum = np.sqrt(power_spectrum,
+                                     out=get_buffer(workspace, "magnitude_spectrum", num_frames, num_fft_bins, dtype))
+
+        # the mel energies are computed in place after the energy column
+        features = get_buffer(workspace, "features", num_frames, self.dim(), dtype)
+        mel_offset = 1 if self.opts.use_energy else 0
+        mel_energies = self.get_mel_banks().apply(power_spectrum, out=features[:, mel_offset:])
+        if self.opts.use_log_fbank:
+            np.maximum(mel_energies, epsilon(), out=mel_energies)
+            np.log(mel_energies, out=mel_energies)
+
+        if self.opts.use_energy:
+            if self.opts.energy_floor > 0.0:
+                signal_log_energies = np.maximum(signal_log_energies, self.log_energy_floor)
+            features[:, 0] = signal_log_energies
+
+        return features
+
     def get_mel_banks(self):
         if self.mel_bank is None:
             self.mel_bank = MelBanks(self.opts.mel_opts, self.opts.frame_opts)
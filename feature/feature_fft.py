@@ -0,0 +1,66 @@
+"""
+    The fft backends used to compute the power spectrum of the frames:
+        - numpy: np.fft, always computes in double precision
+        - scipy: scipy.fft, keeps float32 and uses `workers` threads
+        - torch: torch.fft on cpu
+    Only the scipy backend uses `fft_workers`, the others reject more than one worker.
+    The backend is chosen by `fft_backend` in the config file, one backend is created for each
+    (backend, fft size, workers) and shared, the fft libraries keep their plans for the size between calls.
+"""
+import importlib.util
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+
+
+class NumpyFftBackend(object):
+    SUPPORTS_WORKERS = False
+
+    def __init__(self, n, workers=1):
+        self.n = n
+
+    def rfft(self, frames: np.ndarray) -> np.ndarray:
+        return np.fft.rfft(frames, n=self.n, axis=1)
+
+
+class ScipyFftBackend(object):
+    SUPPORTS_WORKERS = True
+
+    def __init__(self, n, workers=1):
+        self.n = n
+        self.workers = workers
+
+    def rfft(self, frames: np.ndarray) -> np.ndarray:
+        return scipy.fft.rfft(frames, n=self.n, axis=1, workers=self.workers)
+
+
+class TorchFftBackend(object):
+    SUPPORTS_WORKERS = False
+
+    def __init__(self, n, workers=1):
+        # torch is only imported by rfft, check that it is installed when the backend is chosen
+        if importlib.util.find_spec("torch") is None:
+            raise ImportError("fft_backend = torch needs PyTorch, install torch or use the numpy or scipy backend")
+        self.n = n
+
+    def rfft(self, frames: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            return torch.fft.rfft(torch.from_numpy(frames), n=self.n, dim=1).numpy()
+
+
+FFT_BACKENDS = {
+    "numpy": NumpyFftBackend,
+    "scipy": ScipyFftBackend,
+    "torch": TorchFftBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_fft_backend(name, n, workers=1):
+    if name not in FFT_BACKENDS:
+        raise ValueError(f"Unknown fft_backend = {name}, should be one of {list(FFT_BACKENDS.keys())}")
+    if workers > 1 and not FFT_BACKENDS[name].SUPPORTS_WORKERS:
+        raise ValueError(f"fft_workers = {workers} is not supported by fft_backend = {name}, use the scipy backend")
+    return FFT_BACKENDS[name](n, workers)
@@ -1,6 +1,7 @@
 import numpy as np
 
 from feature.feature_config import OptionsParser
+from base.math_util import numeric_limits_float_min
 
 
 def compute_power_spectrum(waveform: np.ndarray) -> np.ndarray:
@@ -26,6 +27,33 @@ def compute_power_spectrum(waveform: np.ndarray) -> np.ndarray:
     return waveform
 
 
+def compute_power_spectrum_matrix(frames: np.ndarray, fft_backend=None, out: np.ndarray = None) -> np.ndarray:
+    """
+        Compute the power spectrum of each row in the frames matrix by a real fft,
+        the result is a (num_frames, padded_window_size // 2 + 1) matrix with the same dtype as the frames,
+        fft_backend is one of the backends in `feature_fft` (default: np.fft),
+        the result is written to out if it is given
+    """
+    if fft_backend is None:
+        spectrum = np.fft.rfft(frames, axis=1)
+    else:
+        spectrum = fft_backend.rfft(frames)
+    if out is None:
+        out = np.empty(spectrum.shape, dtype=frames.dtype)
+    # square the fft output in place, np.fft always computes in double precision and out may be float32
+    np.square(spectrum.real, out=spectrum.real)
+    np.square(spectrum.imag, out=spectrum.imag)
+    return np.add(spectrum.real, spectrum.imag, out=out)
+
+
+def compute_log_energy_matrix(frames: np.ndarray) -> np.ndarray:
+    """
+        Compute the log-energy of each row in the frames matrix
+    """
+    energy = np.einsum("ij,ij->i", frames, frames)
+    return np.log(np.maximum(energy, numeric_limits_float_min()))
+
+
 class DeltaFeatureOptions(object):
 
     def __init__(self, order=2, window=2):
@@ -55,23 +83,53 @@ class DeltaFeature(object):
             for j in range(-window, window + 1):
                 normalizer += j * j
                 for k in range(-prev_offset, prev_offset + 1):
-                    cur_scales[j + k + cur_offset] += float(j) * self.scales[k + prev_offset]
+                    cur_scales[j + k + cur_offset] += float(j) * self.scales[i][k + prev_offset]
             cur_scales /= normalizer
             self.scales.append(cur_scales)
 
     def process(self, input_feats: np.ndarray, frame: int) -> np.ndarray:
+        """
+            The output of one frame, the frames out of the matrix are replaced by the first or last frame
+        """
         num_frames = input_feats.shape[0]
         feat_dim = input_feats.shape[1]
 
-        output_feats = np.zeros((feat_dim * (self.opts.order + 1)))
+        output_feats = np.zeros((feat_dim * (self.opts.order + 1)), dtype=input_feats.dtype)
         for i in range(self.opts.order + 1):
-            max_offset = (self.scales[i] - 1) // 2
-            for j in range(-max_offset, max_offset + 1):
-                offset_frame = min(max(0, frame + j), num_frames - 1)
-                scale = self.scales[i][j + max_offset]
+            max_offset = (self.scales[i].shape[0] - 1) // 2
+            offset_frames = np.clip(np.arange(frame - max_offset, frame + max_offset + 1), 0, num_frames - 1)
+            output_feats[i * feat_dim: (i + 1) * feat_dim] = np.dot(self.scales[i], input_feats[offset_frames])
+        return output_feats
+
+    def process_matrix(self, input_feats: np.ndarray) -> np.ndarray:
+        """
+            The output of all the frames, a (num_frames, feat_dim * (order + 1)) matrix.
+            The input is edge-padded once by the largest offset, then each order is the sum of
+            its scales times the shifted views of the padded input, which is a convolution along the time axis
+        """
+        num_frames, feat_dim = input_feats.shape
+        output_feats = np.zeros((num_frames, feat_dim * (self.opts.order + 1)), dtype=input_feats.dtype)
+        if num_frames == 0:
+            return output_feats
+
+        pad = (self.scales[-1].shape[0] - 1) // 2
+        padded_feats = np.pad(input_feats, ((pad, pad), (0, 0)), mode="edge")
+        for i in range(self.opts.order + 1):
+            max_offset = (self.scales[i].shape[0] - 1) // 2
+            output_block = output_feats[:, i * feat_dim: (i + 1) * feat_dim]
+            for j, scale in enumerate(self.scales[i]):
                 if scale != 0.0:
-                    raise NotImplementedError
-        # TODO
+                    begin = pad - max_offset + j
+                    output_block += scale * padded_feats[begin: begin + num_frames]
+        return output_feats
+
+
+def compute_deltas(opts: DeltaFeatureOptions, input_feats: np.ndarray) -> np.ndarray:
+    """
+        Append the deltas up to opts.order to the features like Kaldi add-deltas,
+        e.g. the 13-dim mfcc gives the 39-dim mfcc + delta + delta-delta with the default options
+    """
+    return DeltaFeature(opts).process_matrix(input_feats)
 
 
 class SlidingWindowCmnOptions(object):
@@ -102,75 +160,170 @@ class SlidingWindowCmnOptions(object):
             assert 0 < self.min_window <= self.cmn_window
 
 
+def sliding_window_cmn_bounds(opts: SlidingWindowCmnOptions, frames: np.ndarray, num_frames=None):
+    """
+        The cmn window [window_start, window_end) of each frame index in frames,
+        num_frames is None if the number of frames is not known yet (the windows are not shifted at the end)
+    """
+    t = frames
+    if opts.center:
+        window_start = t - opts.cmn_window // 2
+        window_end = window_start + opts.cmn_window
+    else:
+        window_start = t - opts.cmn_window
+        window_end = t + 1
+
+    # shift the windows starting before the first frame
+    window_end = np.where(window_start < 0, window_end - window_start, window_end)
+    window_start = np.maximum(window_start, 0)
+
+    if not opts.center:
+        window_end = np.where(window_end > t, np.maximum(t + 1, opts.min_window), window_end)
+
+    # shift the windows ending after the last frame
+    if num_frames is not None:
+        window_start = np.where(window_end > num_frames, window_start - (window_end - num_frames), window_start)
+        window_end = np.minimum(window_end, num_frames)
+        window_start = np.maximum(window_start, 0)
+    return window_start, window_end
+
+
+def normalize_sliding_window_cmn(opts: SlidingWindowCmnOptions,
+                                 input: np.ndarray,
+                                 cur_sum: np.ndarray,
+                                 cur_sumsq: np.ndarray,
+                                 window_frames: np.ndarray,
+                                 output: np.ndarray) -> np.ndarray:
+    """
+        Normalize the frames in input by the sum (and sum of squares) of their windows of window_frames frames
+    """
+    window_frames = window_frames[:, None]
+    output[:] = input - (1. / window_frames) * cur_sum
+
+    if opts.normalize_variance:
+        variance = cur_sumsq * (1. / window_frames)
+        variance -= (window_frames * window_frames) * (cur_sum ** 2)
+        # remove num_floored as usual
+        variance = np.maximum(variance, 1e-10)
+        output *= np.power(variance, -0.5)
+        output[window_frames[:, 0] == 1] = 0.0
+    return output
+
+
 def sliding_window_cmn(opts: SlidingWindowCmnOptions,
                        input: np.ndarray) -> np.ndarray:
+    """
+        The statistics of every window are the differences of the prefix sums (and prefix sums of squares)
+        of the input at the window bounds, so all the frames are normalized by a few matrix operations
+    """
     # remove `SlidingWindowCmnInternal` functions and just use `SlidingWindowCmn`
     opts.check()
     num_frames, dim = input.shape
-    last_window_start = -1
-    last_window_end = -1
     output = np.zeros_like(input)
+    if num_frames == 0:
+        return output
 
-    cur_sum = np.zeros((dim, ))
-    cur_sumsq = np.zeros((dim, ))
-    for t in range(num_frames):
-        if opts.center:
-            window_start = t - opts.cmn_window // 2
-            window_end = window_start + opts.cmn_window
-        else:
-            window_start = t - opts.cmn_window
-            window_end = t + 1
-
-        if window_start < 0:
-            window_end -= window_start
-            window_start = 0
-
-        if not opts.center:
-            if window_end > t:
-                window_end = max(t + 1, opts.min_window)
-
-        if window_end > num_frames:
-            window_start -= (window_end - num_frames)
-            window_end = num_frames
-            if window_start < 0:
-                window_start = 0
-
-        if last_window_start == -1:
-            input_part = input[window_start: window_end, :]
-            cur_sum += np.sum(input_part, axis=0)
-            if opts.normalize_variance:
-                cur_sumsq += np.diag(np.dot(input_part.T, input_part))
-        else:
-            if window_start > last_window_start:
-                assert window_start == last_window_start + 1
-                frame_to_remove = input[last_window_start, :]
-                cur_sum -= frame_to_remove
-                if opts.normalize_variance:
-                    cur_sumsq -= frame_to_remove ** 2
-            if window_end > last_window_end:
-                assert window_end == last_window_end + 1
-                frame_to_add = input[last_window_end, :]
-                cur_sum += frame_to_add
-                if opts.normalize_variance:
-                    cur_sumsq += frame_to_add ** 2
-
-        window_frames = window_end - window_start
-        last_window_start = window_start
-        last_window_end = window_end
-
-        assert window_frames > 0
-        output[t, :] = input[t, :] - 1. / window_frames * cur_sum
-
-        if opts.normalize_variance:
-            if window_frames == 1:
-                output[t, :] = 0.0
-            else:
-                variance = np.copy(cur_sumsq)
-                variance *= 1. / window_frames
-                variance -= (window_frames * window_frames) * (cur_sum ** 2)
-                # remove num_floored as usual
-                variance = np.maximum(variance, 1e-10)
-                variance = np.power(variance, -0.5)
-                output[t, :] = output[t, :] * variance
+    window_start, window_end = sliding_window_cmn_bounds(opts, np.arange(num_frames), num_frames)
+    assert np.all(window_end > window_start)
 
-    return output
+    prefix_sum = np.zeros((num_frames + 1, dim))
+    np.cumsum(input, axis=0, dtype=np.float64, out=prefix_sum[1:])
+    cur_sum = prefix_sum[window_end] - prefix_sum[window_start]
+
+    cur_sumsq = None
+    if opts.normalize_variance:
+        prefix_sumsq = np.zeros((num_frames + 1, dim))
+        np.cumsum(np.square(input, dtype=np.float64), axis=0, out=prefix_sumsq[1:])
+        cur_sumsq = prefix_sumsq[window_end] - prefix_sumsq[window_start]
+
+    return normalize_sliding_window_cmn(opts, input, cur_sum, cur_sumsq, window_end - window_start, output)
+
+
+class OnlineSlidingWindowCmn(object):
+    """
+        Sliding window cmn of the features given chunk by chunk,
+        the concatenation of the outputs of `accept_features` and `flush` equals `sliding_window_cmn`.
+        A frame is output as soon as all the frames of its window have arrived: without center,
+        the first min_window frames wait for each other and then every frame is output at once;
+        with center, every frame waits for cmn_window // 2 frames on its right.
+        The recent frames are kept in a ring buffer of 2 * (window + 1) frames and the statistics of the current
+        window are updated by the frames entering and leaving it, so a chunk costs O(chunk * dim)
+    """
+
+    def __init__(self, opts: SlidingWindowCmnOptions, dim):
+        opts.check()
+        self.opts = opts
+        self.dim = dim
+        max_window = opts.cmn_window if opts.center else max(opts.cmn_window + 1, opts.min_window)
+        self.capacity = 2 * (max_window + 1)
+        self.buffer = np.zeros((self.capacity, dim))
+        self.reset()
+
+    def reset(self):
+        self.num_frames_received = 0
+        self.num_frames_output = 0
+        # the window [window_start, window_end) of the last output frame and its statistics
+        self.window_start = 0
+        self.window_end = 0
+        self.cur_sum = np.zeros((self.dim,))
+        self.cur_sumsq = np.zeros((self.dim,))
+        self.dtype = np.float64
+
+    def accept_features(self, input: np.ndarray) -> np.ndarray:
+        """
+            Append the (num_frames, dim) chunk and return the normalized frames which are ready
+        """
+        self.dtype = input.dtype
+        outputs = [np.zeros((0, self.dim), dtype=self.dtype)]
+        offset = 0
+        while offset < input.shape[0]:
+            # the frames before window_start are not needed any more, their slots are reused
+            num_free = self.capacity - (self.num_frames_received - self.window_start)
+            chunk = input[offset: offset + num_free]
+            self.buffer[self._slots(self.num_frames_received, self.num_frames_received + chunk.shape[0])] = chunk
+            self.num_frames_received += chunk.shape[0]
+            offset += chunk.shape[0]
+            outputs.append(self._output(num_frames=None))
+        return np.concatenate(outputs)
+
+    def flush(self) -> np.ndarray:
+        """
+            The input is finished, return the remaining frames, whose windows are shifted at the end
+        """
+        return self._output(num_frames=self.num_frames_received)
+
+    def _slots(self, begin, end) -> np.ndarray:
+        return np.arange(begin, end) % self.capacity
+
+    def _output(self, num_frames) -> np.ndarray:
+        frames = np.arange(self.num_frames_output, self.num_frames_received)
+        window_start, window_end = sliding_window_cmn_bounds(self.opts, frames, num_frames)
+        # the windows only move forward, so the ready frames are the first ones
+        num_ready = np.count_nonzero(window_end <= self.num_frames_received)
+        if num_ready == 0:
+            return np.zeros((0, self.dim), dtype=self.dtype)
+        frames, window_start, window_end = frames[:num_ready], window_start[:num_ready], window_end[:num_ready]
+
+        # prefix sums of the frames entering and leaving the window
+        added = self.buffer[self._slots(self.window_end, window_end[-1])]
+        removed = self.buffer[self._slots(self.window_start, window_start[-1])]
+        prefix_added = np.concatenate([np.zeros((1, self.dim)), np.cumsum(added, axis=0)])
+        prefix_removed = np.concatenate([np.zeros((1, self.dim)), np.cumsum(removed, axis=0)])
+        cur_sum = self.cur_sum + prefix_added[window_end - self.window_end] \
+            - prefix_removed[window_start - self.window_start]
+
+        cur_sumsq = None
+        if self.opts.normalize_variance:
+            prefix_added = np.concatenate([np.zeros((1, self.dim)), np.cumsum(added ** 2, axis=0)])
+            prefix_removed = np.concatenate([np.zeros((1, self.dim)), np.cumsum(removed ** 2, axis=0)])
+            cur_sumsq = self.cur_sumsq + prefix_added[window_end - self.window_end] \
+                - prefix_removed[window_start - self.window_start]
+            self.cur_sumsq = cur_sumsq[-1]
+
+        self.cur_sum = cur_sum[-1]
+        self.window_start, self.window_end = window_start[-1], window_end[-1]
+        self.num_frames_output += num_ready
+
+        output = np.zeros((num_ready, self.dim), dtype=self.dtype)
+        return normalize_sliding_window_cmn(self.opts, self.buffer[self._slots(frames[0], frames[-1] + 1)],
+                                            cur_sum, cur_sumsq, window_end - window_start, output)
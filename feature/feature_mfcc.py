@@ -6,18 +6,21 @@
 import numpy as np
 
 from feature.feature_window import FrameExtractionOptions
-from feature.mel_computations import MelBanks, MelBanksOptions, compute_lifter_coeffs
+from feature.mel_computations import MelBanks, MelBanksOptions
 from feature.feature_config import OptionsParser
 from base.math_util import epsilon, numeric_limits_float_min
-from matrix.matrix_functions import compute_dct_matrix
+from feature.feature_tables import get_dct_matrix, get_lifter_coeffs
+from feature.feature_workspace import FeatureWorkspace, get_buffer
+from feature.feature_functions import compute_power_spectrum_matrix, compute_log_energy_matrix
 
 
 class MfccOptions(object):
     def __init__(self,
                  frame_opts: FrameExtractionOptions = None,
-                 mel_opts: MelBanksOptions = MelBanksOptions(num_bins=23)) -> None:
+                 mel_opts: MelBanksOptions = None) -> None:
         self.frame_opts = frame_opts if frame_opts is not None else FrameExtractionOptions()
-        self.mel_opts = mel_opts if mel_opts is not None else MelBanksOptions()
+        # a default instance would be shared (and registered) by all the MfccOptions
+        self.mel_opts = mel_opts if mel_opts is not None else MelBanksOptions(num_bins=23)
 
         self.num_ceps = 13
         self.use_energy = True
@@ -50,20 +53,19 @@ class MfccComputer(object):
         if opts.num_ceps > num_bins:
             raise ValueError(f"num-ceps {opts.num_ceps} cannot be larger than num-mel-bins {num_bins}.")
 
-        dct_matrix = np.zeros((num_bins, num_bins))
-        dct_matrix = compute_dct_matrix(dct_matrix)
-        self.dct_matrix = dct_matrix[:opts.num_ceps, :num_bins]
+        dtype = opts.frame_opts.get_dtype()
+        self.dct_matrix = get_dct_matrix(opts.num_ceps, num_bins, dtype)
 
         self.lifter_coeffs = None
         if opts.cepstral_lifter != 0.0:
-            self.lifter_coeffs = np.zeros((opts.num_ceps,))
-            self.lifter_coeffs = compute_lifter_coeffs(opts.cepstral_lifter, self.lifter_coeffs)
+            self.lifter_coeffs = get_lifter_coeffs(opts.num_ceps, opts.cepstral_lifter, dtype)
 
         if opts.energy_floor > 0.0:
             self.log_energy_floor = np.log(opts.energy_floor)
 
         self.mel_banks = None
         self.get_mel_banks()
+        self.fft_backend = opts.frame_opts.get_fft_backend()
 
     def compute(self,
                 signal_log_energy,
@@ -76,12 +78,7 @@ class MfccComputer(object):
             signal_log_energy = np.log(max(np.dot(signal_frame, signal_frame), numeric_limits_float_min()))
 
         # Do srfft, and ComputePowerSpectrum
-        signal_frame = np.fft.fft(signal_frame)
-        # print(f"signal_frame:\n{signal_frame}")
-        signal_frame = np.abs(signal_frame) ** 2  # get energy
-
-        signal_frame_dim = signal_frame.shape[0]
-        power_spectrum = signal_frame[:signal_frame_dim // 2 + 1]
+        power_spectrum = compute_power_spectrum_matrix(signal_frame[None, :], self.fft_backend)[0]
 
         mel_energies = mel_banks.compute(power_spectrum)
         mel_energies = np.maximum(mel_energies, epsilon())
@@ -99,11 +96,56 @@ class MfccComputer(object):
 
         return feature
 
+    def compute_matrix(self,
+                       signal_log_energies: np.ndarray,
+                       signal_frames: np.ndarray,
+                       power_spectrum: np.ndarray = None,
+                       workspace: FeatureWorkspace = None) -> np.ndarray:
+        """
+            Compute the features for all the frames of an utterance,
+            signal_frames is a (num_frames, padded_window_size) matrix,
+            power_spectrum can be given if it is already computed from the signal_frames, it is not modified,
+            the intermediate matrices and the result are views of the workspace buffers if workspace is given
+        """
+        assert signal_frames.shape[1] == self.opts.frame_opts.get_padded_window_size()
+        num_frames = signal_frames.shape[0]
+        dtype = signal_frames.dtype
+
+        if self.opts.use_energy and not self.opts.raw_energy:
+            signal_log_energies = compute_log_energy_matrix(signal_frames)
+
+        if power_spectrum is None:
+            power_spectrum = compute_power_spectrum_matrix(
+                signal_frames, self.fft_backend,
+                out=get_buffer(workspace, "power_spectrum", num_frames, signal_frames.shape[1] // 2 + 1, dtype))
+
+        mel_energies = self.get_mel_banks().apply(
+            power_spectrum, out=get_buffer(workspace, "mel_energies", num_frames, self.opts.mel_opts.num_bins, dtype))
+        np.maximum(mel_energies, epsilon(), out=mel_energies)
+        np.log(mel_energies, out=mel_energies)
+
+        features = np.matmul(mel_energies, self.dct_matrix.T,
+                             out=get_buffer(workspace, "features", num_frames, self.dim(), dtype))
+
+        if self.opts.cepstral_lifter != 0.0:
+            features *= self.lifter_coeffs
+
+        if self.opts.use_energy:
+            if self.opts.energy_floor > 0.0:
+                signal_log_energies = np.maximum(signal_log_energies, self.log_energy_floor)
+            features[:, 0] = signal_log_energies
+
+        return features
+
     def get_mel_banks(self) -> MelBanks:
         if self.mel_banks is None:
             self.mel_banks = MelBanks(self.opts.mel_opts, self.opts.frame_opts)
         return self.mel_banks
 
+    def has_log_energy(self):
+        # the column 0 of the features is the log energy
+        return self.opts.use_energy
+
     def need_raw_log_energy(self):
         return self.opts.use_energy and self.opts.raw_energy
 
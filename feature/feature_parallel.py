@@ -0,0 +1,149 @@
+"""
+    Utterance-parallel feature extraction:
+        the utterances in wav.scp are distributed over `nj` processes,
+        each process writes its own archive shard and scp fragment,
+        and the fragments are merged into one sorted feats.scp at the end.
+    The energy vad can be computed in the same pass from the features in memory and written as vad.scp
+"""
+import logging
+import os
+from multiprocessing import Pool
+from typing import List, Tuple
+
+import numpy as np
+
+from feature.feature_common import FusedFeatureExtractor, BlockParallelOptions
+from feature.feature_config import OptionsParser
+from feature.voice_activity_detection import VadEnergyOptions
+from feature.feature_writer import FeatureWriter
+from util.holder import WavHolder
+from util.processor import ScriptProcessor
+from util.provider import merge_scp
+
+# (feature_type, config_file, config_section)
+FeatureConfig = Tuple[str, str, str]
+# (config_file, config_section) of the VadEnergyOptions
+VadConfig = Tuple[str, str]
+
+
+def split_wav_scp(wav_scp, nj) -> List[List[Tuple[str, str]]]:
+    """
+        Split the utterances of wav.scp into nj parts, interleaved to balance the length of the parts
+    """
+    wav_items = list(ScriptProcessor(scp_path=wav_scp))
+    return [wav_items[j::nj] for j in range(nj)]
+
+
+def compute_features_shard(feature_configs: List[FeatureConfig],
+                           wav_items: List[Tuple[str, str]],
+                           save_paths: List[str],
+                           shard_index,
+                           split_num,
+                           batch_size=1,
+                           vad_config: VadConfig = None) -> List[str]:
+    """
+        Compute the features of the wav_items and write them to the shard_index-th shard
+        (shard_index = None for a single process), batch_size utterances are computed together.
+        If vad_config is given, the vad of the first feature is written to save_paths[0] as vad.scp,
+        its scp fragment is the last one returned
+    """
+    feature_extractor = FusedFeatureExtractor([(feature_type, OptionsParser(config_file, config_section))
+                                               for feature_type, config_file, config_section in feature_configs],
+                                              return_views=True)
+    feature_writers = [FeatureWriter(save_path, split_num=split_num, shard_index=shard_index)
+                       for save_path in save_paths]
+    wav_holder = WavHolder()
+
+    vad_opts, vad_writer = None, None
+    if vad_config is not None:
+        vad_opts = VadEnergyOptions()
+        vad_opts.register(OptionsParser(*vad_config))
+        vad_writer = FeatureWriter(save_paths[0], split_num=split_num, shard_index=shard_index,
+                                   name="vad", item_ndim=1, dtype=np.float32)
+
+    for i in range(0, len(wav_items), batch_size):
+        utt_ids, waves, sample_rates = list(), list(), list()
+        for utt_id, wav_path in wav_items[i: i + batch_size]:
+            wav, sample_rate = wav_holder.read(wav_path)
+            utt_ids.append(utt_id)
+            waves.append(wav)
+            sample_rates.append(sample_rate)
+
+        if vad_writer is None:
+            batch_results = feature_extractor.compute_batch_features(waves, sample_rates)
+        else:
+            # the raw log energy of the frames is kept from the framing if the vad needs it
+            batch_results, batch_log_energies = feature_extractor.compute_batch_features(waves, sample_rates,
+                                                                                         return_log_energy=True)
+
+        for j, (utt_id, results) in enumerate(zip(utt_ids, batch_results)):
+            logging.debug(f"utt_id = {utt_id}, result.shape = {[result.shape for result in results]}")
+            for feature_writer, result in zip(feature_writers, results):
+                feature_writer.write(utt_id, result)
+            if vad_writer is not None:
+                vad = feature_extractor.extractors[0].compute_vad(vad_opts, results[0], batch_log_energies[j])
+                write_vad(vad_writer, utt_id, vad)
+
+    scps = [feature_writer.flush() for feature_writer in feature_writers]
+    if vad_writer is not None:
+        scps.append(vad_writer.flush())
+    return scps
+
+
+def write_vad(vad_writer: FeatureWriter, utt_id, vad: np.ndarray):
+    """
+        Write the vad like featurebin/compute_vad.py, which skips the empty and the completely unvoiced ones,
+        the (num_channels, num_frames) vad of a stacked multi-channel wave is written (or skipped) for each channel
+        as <utt_id>-<channel> like `FeatureWriter.write`
+    """
+    if vad.ndim == 2:
+        for channel, channel_vad in enumerate(vad):
+            write_vad(vad_writer, f"{utt_id}-{channel}", channel_vad)
+    elif vad.size == 0:
+        logging.warning(f"Empty feature matrix for utterance {utt_id}")
+    elif np.sum(vad) == 0.0:
+        logging.warning(f"No frames were judged voiced for utterance {utt_id}")
+    else:
+        vad_writer.write(utt_id, vad)
+
+
+def compute_features_parallel(feature_configs: List[FeatureConfig],
+                              data_path,
+                              save_paths: List[str],
+                              nj=1,
+                              batch_size=1,
+                              vad_config: VadConfig = None):
+    """
+        Compute the features of each config in feature_configs for the wav.scp in data_path with nj processes,
+        the i-th feature is written to save_paths[i] as `feature_{1..nj}.ark` and one feats.scp.
+        With nj = 1 the features are computed in this process.
+        If vad_config is given, the vad is also written to save_paths[0] as `vad_{1..nj}.ark` and vad.scp
+    """
+    assert nj > 0 and batch_size > 0 and len(feature_configs) == len(save_paths)
+    wav_scp = os.path.join(data_path, "wav.scp")
+    if not os.path.isfile(wav_scp):
+        raise RuntimeError(f"wav.scp: {wav_scp} do not exist")
+
+    if nj == 1:
+        wav_items = list(ScriptProcessor(scp_path=wav_scp))
+        compute_features_shard(feature_configs, wav_items, save_paths, None, 1, batch_size, vad_config)
+        return
+
+    for feature_type, config_file, config_section in feature_configs:
+        block_opts = BlockParallelOptions()
+        block_opts.register(OptionsParser(config_file, config_section))
+        if block_opts.num_workers > 1 and block_opts.use_processes:
+            # the pool processes are daemonic and cannot start the processes of a ProcessPoolExecutor
+            raise ValueError(f"block_use_processes cannot be used with nj = {nj} > 1 "
+                             f"(config {config_file} [{config_section}]), use the block threads instead")
+
+    shards = split_wav_scp(wav_scp, nj)
+    with Pool(processes=nj) as pool:
+        shard_scps = pool.starmap(compute_features_shard,
+                                  [(feature_configs, wav_items, save_paths, j, nj, batch_size, vad_config)
+                                   for j, wav_items in enumerate(shards)])
+
+    for i, save_path in enumerate(save_paths):
+        merge_scp([scps[i] for scps in shard_scps], os.path.join(save_path, "feats.scp"))
+    if vad_config is not None:
+        merge_scp([scps[-1] for scps in shard_scps], os.path.join(save_paths[0], "vad.scp"))
@@ -10,18 +10,23 @@ Warning:
 """
 
 from util.table import SequentialTableReader
-from util.holder import MatrixHolder
+from util.holder import MatrixHolder, MmapMatrixHolder, MMAP_POOL_SIZE
 from util.processor import ScriptProcessor
 
 
 class FeatureReader(object):
 
-    def __init__(self, feats_scp):
+    def __init__(self, feats_scp, use_mmap=False, max_open_maps=MMAP_POOL_SIZE):
+        """
+            use_mmap: read the uncompressed matrices as read-only views of memory-mapped arks,
+                which only reads the pages used, copy a matrix before modifying it.
+                At most max_open_maps arks are kept mapped
+        """
         self.feats_scp = feats_scp
         # define script_processor function
         self.script_processor = ScriptProcessor(scp_path=feats_scp)
         # define holder function
-        self.holder = MatrixHolder(mode="rb")
+        self.holder = MmapMatrixHolder(max_open_maps) if use_mmap else MatrixHolder(mode="rb")
         self.reader = SequentialTableReader(read_specifier=feats_scp,
                                             holder=self.holder,
                                             scp_processor=self.script_processor)
@@ -33,5 +38,11 @@ class FeatureReader(object):
         for key, value in self.reader:
             yield key, value
 
+    def __getitem__(self, index):
+        """
+            The features of the utt_id or of the index-th utterance of the feats.scp
+        """
+        return self.reader[index]
+
     def __del__(self):
         del self.holder
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+    Polyphase resampling of the waves whose sample frequency differs from samp_freq of the frame options,
+    allowed by allow_downsample / allow_upsample like Kaldi.
+    The anti-aliasing filter of each (in_rate, out_rate) is designed once and shared, it is read-only.
+"""
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+# Number of distinct (in_rate, out_rate) filters kept, the least recently used one is dropped first
+RESAMPLE_CACHE_SIZE = 32
+
+# Kaiser window of the low-pass filter, the same design as the default of scipy.signal.resample_poly
+RESAMPLE_KAISER_BETA = 5.0
+RESAMPLE_HALF_LENGTH_PER_RATE = 10
+
+
+def _integer_rate(rate) -> int:
+    if int(rate) != rate or rate <= 0:
+        raise ValueError(f"Cannot resample from or to a sample frequency of {rate}, it should be a positive integer")
+    return int(rate)
+
+
+@lru_cache(maxsize=RESAMPLE_CACHE_SIZE)
+def get_resample_filter(in_rate, out_rate):
+    """
+        Return (up, down, filter), the wave is upsampled by up, low-pass filtered and downsampled by down
+    """
+    ratio = Fraction(_integer_rate(out_rate), _integer_rate(in_rate))
+    up, down = ratio.numerator, ratio.denominator
+    max_rate = max(up, down)
+    resample_filter = firwin(2 * RESAMPLE_HALF_LENGTH_PER_RATE * max_rate + 1, 1.0 / max_rate,
+                             window=("kaiser", RESAMPLE_KAISER_BETA))
+    resample_filter.flags.writeable = False
+    return up, down, resample_filter
+
+
+def resample_wave(wave: np.ndarray, in_rate, out_rate) -> np.ndarray:
+    """
+        Resample the wave (samples on the last axis) from in_rate to out_rate,
+        the output has ceil(wave.shape[-1] * out_rate / in_rate) samples
+    """
+    if in_rate == out_rate:
+        return wave
+    up, down, resample_filter = get_resample_filter(in_rate, out_rate)
+    dtype = wave.dtype if np.issubdtype(wave.dtype, np.floating) else np.float64
+    return resample_poly(wave.astype(dtype, copy=False), up, down, axis=-1, window=resample_filter)
+
+
+def convert_sample_freq(wave: np.ndarray, sample_freq, frame_opts) -> np.ndarray:
+    """
+        Bring the wave of sample_freq to samp_freq of the frame options, as allowed by the options
+    """
+    if sample_freq == frame_opts.samp_freq:
+        return wave
+    if sample_freq > frame_opts.samp_freq and not frame_opts.allow_downsample:
+        raise ValueError(f"Waveform sample frequency {sample_freq} is larger than samp_freq {frame_opts.samp_freq}, "
+                         f"set allow_downsample to downsample it")
+    if sample_freq < frame_opts.samp_freq and not frame_opts.allow_upsample:
+        raise ValueError(f"Waveform sample frequency {sample_freq} is smaller than samp_freq {frame_opts.samp_freq}, "
+                         f"set allow_upsample to upsample it")
+    return resample_wave(wave, sample_freq, frame_opts.samp_freq)
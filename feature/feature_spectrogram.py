@@ -3,6 +3,8 @@ import numpy as np
 from feature.feature_window import FrameExtractionOptions
 from feature.feature_config import OptionsParser
 from base.math_util import epsilon, numeric_limits_float_min
+from feature.feature_functions import compute_power_spectrum_matrix, compute_log_energy_matrix
+from feature.feature_workspace import FeatureWorkspace, get_buffer
 
 
 class SpectrogramOptions(object):
@@ -30,17 +32,14 @@ class SpectrogramComputer(object):
         self.log_energy_floor = 0.0
         if opts.energy_floor > 0.0:
             self.log_energy_floor = np.log(opts.energy_floor)
+        self.fft_backend = opts.get_frame_options().get_fft_backend()
 
     def compute(self,
                 signal_log_energy,
                 signal_frame: np.ndarray) -> np.ndarray:
         if not self.opts.raw_energy:
-            signal_log_energy = np.log(np.log(max(np.dot(signal_frame, signal_frame), numeric_limits_float_min())))
-        signal_frame = np.fft.fft(signal_frame)
-        signal_frame = np.abs(signal_frame) ** 2
-        signal_frame_dim = signal_frame.shape[0]
-
-        power_spectrum = signal_frame[:signal_frame_dim // 2 + 1]
+            signal_log_energy = np.log(max(np.dot(signal_frame, signal_frame), numeric_limits_float_min()))
+        power_spectrum = compute_power_spectrum_matrix(signal_frame[None, :], self.fft_backend)[0]
         power_spectrum = np.maximum(power_spectrum, epsilon())
         feature = np.log(power_spectrum)
 
@@ -49,8 +48,42 @@ class SpectrogramComputer(object):
         feature[0] = signal_log_energy
         return feature
 
+    def compute_matrix(self,
+                       signal_log_energies: np.ndarray,
+                       signal_frames: np.ndarray,
+                       power_spectrum: np.ndarray = None,
+                       workspace: FeatureWorkspace = None) -> np.ndarray:
+        """
+            Compute the features for all the frames of an utterance,
+            signal_frames is a (num_frames, padded_window_size) matrix,
+            power_spectrum can be given if it is already computed from the signal_frames, it is not modified,
+            the intermediate matrices and the result are views of the workspace buffers if workspace is given
+        """
+        num_frames = signal_frames.shape[0]
+        features = get_buffer(workspace, "features", num_frames, self.dim(), signal_frames.dtype)
+
+        if not self.opts.raw_energy:
+            signal_log_energies = compute_log_energy_matrix(signal_frames)
+
+        if power_spectrum is None:
+            power_spectrum = compute_power_spectrum_matrix(signal_frames, self.fft_backend, out=features)
+        np.maximum(power_spectrum, epsilon(), out=features)
+        np.log(features, out=features)
+
+        if self.opts.energy_floor > 0.0:
+            signal_log_energies = np.maximum(signal_log_energies, self.log_energy_floor)
+        features[:, 0] = signal_log_energies
+        return features
+
     def dim(self):
         return self.opts.get_frame_options().get_padded_window_size() // 2 + 1
 
+    def has_log_energy(self):
+        # the column 0 of the features is the log energy
+        return True
+
     def need_raw_log_energy(self):
         return self.opts.raw_energy
+
+    def get_frame_extraction_options(self):
+        return self.opts.get_frame_options()
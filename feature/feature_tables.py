@@ -0,0 +1,55 @@
+"""
+    The constant tables used by the numpy computers and the torch kernels:
+        - window function
+        - dct matrix
+        - cepstral lifter coefficients
+    The tables are computed in float64, cast to the requested dtype once for each set of parameters and shared,
+    so they are read-only and should be copied before modified.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from matrix.matrix_functions import compute_dct_matrix, compute_lifter_coeffs
+
+# Number of distinct tables of each kind kept, the least recently used one is dropped first
+TABLES_CACHE_SIZE = 32
+
+
+def _read_only(table: np.ndarray) -> np.ndarray:
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=TABLES_CACHE_SIZE)
+def get_window_function(window_type, frame_length, blackman_coeff=0.42, dtype=np.float64) -> np.ndarray:
+    assert frame_length > 0
+    a = 2 * np.pi / (frame_length - 1)
+    i_fl = np.arange(frame_length, dtype=np.float64)
+
+    if window_type == "hanning":
+        window = 0.5 - 0.5 * np.cos(a * i_fl)
+    elif window_type == "hamming":
+        window = 0.54 - 0.46 * np.cos(a * i_fl)
+    elif window_type == "povey":
+        window = np.power(0.5 - 0.5 * np.cos(a * i_fl), 0.85)
+    elif window_type == "rectangular":
+        window = np.ones((frame_length,))
+    elif window_type == "blackman":
+        window = blackman_coeff - 0.5 * np.cos(a * i_fl) + (0.5 - blackman_coeff) * np.cos(2 * a * i_fl)
+    else:
+        raise ValueError(f"Unknown window_type = {window_type}")
+    return _read_only(window.astype(dtype))
+
+
+@lru_cache(maxsize=TABLES_CACHE_SIZE)
+def get_dct_matrix(num_ceps, num_bins, dtype=np.float64) -> np.ndarray:
+    if num_ceps > num_bins:
+        raise ValueError(f"num-ceps {num_ceps} cannot be larger than num-mel-bins {num_bins}.")
+    dct_matrix = compute_dct_matrix(np.zeros((num_bins, num_bins)))
+    return _read_only(dct_matrix[:num_ceps, :num_bins].astype(dtype))
+
+
+@lru_cache(maxsize=TABLES_CACHE_SIZE)
+def get_lifter_coeffs(num_ceps, cepstral_lifter, dtype=np.float64) -> np.ndarray:
+    return _read_only(compute_lifter_coeffs(cepstral_lifter, np.zeros((num_ceps,))).astype(dtype))
@@ -1,9 +1,12 @@
-from typing import Tuple
+from typing import List, Tuple
 import numpy as np
 
-from base.math_util import round_up_to_nearest_power_of_two
+from base.math_util import round_up_to_nearest_power_of_two, round_up_to_fast_fft_length
 from base.math_util import epsilon
 from feature.feature_config import OptionsParser
+from feature.feature_tables import get_window_function
+from feature.feature_fft import get_fft_backend
+from feature.feature_workspace import FeatureWorkspace, get_buffer
 
 
 class FrameExtractionOptions(object):
@@ -18,7 +21,12 @@ class FrameExtractionOptions(object):
                  window_type="povey",
                  blackman_coeff=0.42,
                  snip_edges=True,
-                 allow_downsample=False):
+                 allow_downsample=False,
+                 allow_upsample=False,
+                 dtype="float64",
+                 round_to_power_of_two=True,
+                 fft_backend="numpy",
+                 fft_workers=1):
         self.samp_freq = samp_freq
         self.frame_shift = frame_shift
         self.frame_length = frame_length
@@ -29,6 +37,11 @@ class FrameExtractionOptions(object):
         self.blackman_coeff = blackman_coeff
         self.snip_edges = snip_edges
         self.allow_downsample = allow_downsample
+        self.allow_upsample = allow_upsample
+        self.dtype = dtype
+        self.round_to_power_of_two = round_to_power_of_two
+        self.fft_backend = fft_backend
+        self.fft_workers = fft_workers
 
     def register(self, option_parser: OptionsParser):
         self.samp_freq = option_parser.get("samp_freq", 16000, type_function=np.int)
@@ -41,6 +54,11 @@ class FrameExtractionOptions(object):
         self.blackman_coeff = option_parser.get("blackman_coeff", 0.42, type_function=np.float)
         self.snip_edges = option_parser.get("snip_edges", True, type_function=np.bool)
         self.allow_downsample = option_parser.get("allow_downsample", "False", type_function=np.bool)
+        self.allow_upsample = option_parser.get("allow_upsample", "False", type_function=np.bool)
+        self.dtype = option_parser.get("dtype", "float64", type_function=np.str)
+        self.round_to_power_of_two = option_parser.get("round_to_power_of_two", "True", type_function=np.bool)
+        self.fft_backend = option_parser.get("fft_backend", "numpy", type_function=np.str)
+        self.fft_workers = option_parser.get("fft_workers", 1, type_function=np.int)
 
     def get_win_shift(self):
         return np.int(self.samp_freq * 0.001 * self.frame_shift)
@@ -48,12 +66,27 @@ class FrameExtractionOptions(object):
     def get_win_size(self):
         return np.int(self.samp_freq * 0.001 * self.frame_length)
 
+    def get_dtype(self):
+        """
+            The float type used through the whole pipeline, "float32" halves the memory and the written matrices
+        """
+        dtype = np.dtype(self.dtype)
+        if dtype not in [np.float32, np.float64]:
+            raise ValueError(f"Unsupported dtype = {self.dtype}, should be float32 or float64")
+        return dtype
+
     def get_padded_window_size(self):
         """
             padded the window size to 2^k, please check in the round_up_to_nearest_power_of_two function
             Two make the fft effectively, always use this methods
+            If round_to_power_of_two is False (not compatible with Kaldi), pad to a fast fft length instead
         """
-        return round_up_to_nearest_power_of_two(self.get_win_size())
+        if self.round_to_power_of_two:
+            return round_up_to_nearest_power_of_two(self.get_win_size())
+        return round_up_to_fast_fft_length(self.get_win_size())
+
+    def get_fft_backend(self):
+        return get_fft_backend(self.fft_backend, self.get_padded_window_size(), self.fft_workers)
 
 
 class FeatureWindowFunction(object):
@@ -64,27 +97,8 @@ class FeatureWindowFunction(object):
         self._init()
 
     def _init(self):
-        frame_length = self.opts.get_win_size()
-        assert frame_length > 0
-
-        self.window = np.zeros((frame_length,))
-        a = 2 * np.pi / (frame_length - 1)
-
-        for i in range(frame_length):
-            i_fl = float(i)
-            if self.opts.window_type == "hanning":
-                self.window[i] = 0.5 - 0.5 * np.cos(a * i_fl)
-            elif self.opts.window_type == "hamming":
-                self.window[i] = 0.54 - 0.46 * np.cos(a * i_fl)
-            elif self.opts.window_type == "povey":
-                self.window[i] = np.power(0.5 - 0.5 * np.cos(a * i_fl), 0.85)
-            elif self.opts.window_type == "rectangular":
-                self.window[i] = 1.
-            elif self.opts.window_type == "blackman":
-                self.window[i] = self.opts.blackman_coeff - 0.5 * np.cos(a * i_fl) + (
-                        0.5 - self.opts.blackman_coeff) * np.cos(2 * a * i_fl)
-            else:
-                raise ValueError(f"Unknown window_type = {self.opts.window_type}")
+        self.window = get_window_function(self.opts.window_type, self.opts.get_win_size(), self.opts.blackman_coeff,
+                                          self.opts.get_dtype())
 
     def get_window(self):
         return self.window
@@ -138,41 +152,111 @@ def dither(wave_form, dither_value):
 def preemphasize(wave_form: np.ndarray, preemph_coeff):
     if preemph_coeff == 0.0:
         return None
-    assert 0.0 <= preemph_coeff <= 1.0
-    i = wave_form.shape[0] - 1
-    while i > 0:
-        wave_form[i] -= preemph_coeff * wave_form[i - 1]
-        i -= 1
-    wave_form[0] *= (1. - preemph_coeff)
+    preemphasize_matrix(wave_form[None, :], preemph_coeff)
     return wave_form
 
 
+def preemphasize_matrix(windows: np.ndarray, preemph_coeff):
+    """
+        Pre-emphasize each row of the (num_frames, frame_length) windows in place
+    """
+    if preemph_coeff == 0.0:
+        return None
+    assert 0.0 <= preemph_coeff <= 1.0
+    # the right side is evaluated before the subtraction, so every sample uses the previous original sample
+    windows[:, 1:] -= preemph_coeff * windows[:, :-1]
+    windows[:, 0] *= (1. - preemph_coeff)
+    return windows
+
+
+def remove_dc_offset_matrix(windows: np.ndarray):
+    """
+        Remove the mean of each row of the (num_frames, frame_length) windows in place
+    """
+    windows -= np.sum(windows, axis=1, keepdims=True) / windows.shape[1]
+    return windows
+
+
+def compute_log_energy_pre_window(windows: np.ndarray) -> np.ndarray:
+    """
+        The log energy of each row of the (num_frames, frame_length) windows
+    """
+    # the stacked matmul gives the same value as np.dot for each frame
+    energy = np.matmul(windows[:, None, :], windows[:, :, None])[:, 0, 0]
+    return np.log(np.maximum(energy, epsilon()))
+
+
 def process_window(opts: FrameExtractionOptions,
                    window_function: FeatureWindowFunction,
                    window: np.ndarray,
                    log_energy_pre_window):
     # dither -> remove_dc_offset -> preemph
-    frame_length = opts.get_win_size()
+    windows, log_energies = process_windows(opts, window_function, window[None, :],
+                                            log_energy_pre_window is not None)
+    if log_energies is not None:
+        log_energy_pre_window = log_energies[0]
+    return windows[0], log_energy_pre_window
+
+
+def process_windows(opts: FrameExtractionOptions,
+                    window_function: FeatureWindowFunction,
+                    windows: np.ndarray,
+                    compute_log_energy=False):
+    """
+        The batched version of `process_window`, the windows is a (num_frames, frame_length) matrix
+        and will be modified in place, the log-energy pre-window of each frame is returned if needed
+    """
+    # dither -> remove_dc_offset -> preemph
 
     # TODO: use dither
     # if opts.dither != 0.0:
 
     if opts.remove_dc_offset:
-        # print(f"remove_dc_offset: {np.sum(window)} frame_length: {frame_length} add_value: {(-np.sum(window) / frame_length)}")
-        window -= np.sum(window) / frame_length
-    # print(f"after remove_dc_offset outputs:\n{window}")
+        remove_dc_offset_matrix(windows)
 
-    if log_energy_pre_window is not None:
-        energy = np.maximum(np.dot(window, window), epsilon())
-        log_energy_pre_window = np.log(energy)
+    log_energy_pre_window = None
+    if compute_log_energy:
+        log_energy_pre_window = compute_log_energy_pre_window(windows)
 
     if opts.preemph_coeff != 0.0:
-        window = preemphasize(window, opts.preemph_coeff)
-    # print(f"after preemph window:\n{window}")
-
-    window = window * window_function.window
-    # print(f"after window_function:\n{window}")
-    return window, log_energy_pre_window
+        preemphasize_matrix(windows, opts.preemph_coeff)
+
+    windows *= window_function.window
+    return windows, log_energy_pre_window
+
+
+def reflect_indices(indices: np.ndarray, wave_dim) -> np.ndarray:
+    """
+        Map the sample indices outside [0, wave_dim) back into the wave like Kaldi does,
+        -1 -> 0, -2 -> 1, ..., wave_dim -> wave_dim - 1, ...
+        Kaldi reflects repeatedly until the index is inside, which is periodic with period 2 * wave_dim
+    """
+    period = 2 * wave_dim
+    indices = np.mod(indices, period)
+    return np.where(indices >= wave_dim, period - 1 - indices, indices)
+
+
+def reflect_pad_wave(wave: np.ndarray, begin, end, sample_offset=0, num_samples=None) -> np.ndarray:
+    """
+        Return the samples [begin, end) of the whole wave, the samples outside [0, num_samples) are reflected.
+        The wave holds the samples [sample_offset, sample_offset + wave_dim) of the whole wave
+        and num_samples is the length of the whole wave (default: sample_offset + wave_dim)
+    """
+    wave_dim = wave.shape[0]
+    if num_samples is None:
+        num_samples = sample_offset + wave_dim
+    inner_begin = min(max(begin, 0), num_samples)
+    inner_end = max(min(end, num_samples), inner_begin)
+    assert inner_begin >= sample_offset and inner_end <= sample_offset + wave_dim
+
+    inner = wave[inner_begin - sample_offset: inner_end - sample_offset]
+    if begin >= 0 and end <= num_samples:
+        return inner
+
+    left = reflect_indices(np.arange(begin, min(0, end)), num_samples) - sample_offset
+    right = reflect_indices(np.arange(max(num_samples, begin), end), num_samples) - sample_offset
+    assert np.all(left >= 0) and np.all(right >= 0), "The reflected samples have been discarded"
+    return np.concatenate([wave[left], inner, wave[right]])
 
 
 def extract_window(sample_offset,
@@ -197,20 +281,11 @@ def extract_window(sample_offset,
     wave_start = np.int(start_sample - sample_offset)
     wave_end = wave_start + frame_length
 
-    window = np.zeros((frame_length_padded,))
+    window = np.zeros((frame_length_padded,), dtype=opts.get_dtype())
     if wave_start >= 0 and wave_end <= wave.shape[0]:
         window[:frame_length] = np.copy(wave[wave_start: wave_end])
     else:
-        wave_dim = wave.shape[0]
-        for s in range(frame_length):
-            s_in_wave = s + wave_start
-
-            while s_in_wave < 0 or s_in_wave >= wave_dim:
-                if s_in_wave < 0:
-                    s_in_wave = - s_in_wave - 1
-                else:
-                    s_in_wave = 2 * wave_dim - 1 - s_in_wave
-            window[s] = wave[s_in_wave]
+        window[:frame_length] = wave[reflect_indices(np.arange(wave_start, wave_end), wave.shape[0])]
 
     if frame_length_padded > frame_length:
         window[frame_length: frame_length_padded] = 0.0
@@ -221,3 +296,121 @@ def extract_window(sample_offset,
                                                                   log_energy_pre_window)
 
     return window, log_energy_pre_window
+
+
+def fill_windows(windows: np.ndarray,
+                 wave: np.ndarray,
+                 opts: FrameExtractionOptions,
+                 sample_offset=0,
+                 first_frame=0,
+                 num_samples=None):
+    """
+        Copy the raw frames [first_frame, first_frame + windows.shape[0]) of the wave
+        into the first frame_length columns of the windows, see `extract_windows` for the arguments
+    """
+    if num_samples is None:
+        num_samples = sample_offset + wave.shape[0]
+    num_frames = windows.shape[0]
+    frame_length = opts.get_win_size()
+    frame_shift = opts.get_win_shift()
+
+    # reflect the edges once (snip_edges = False), then every frame is a row of a strided view
+    begin = first_sample_of_frame(first_frame, opts)
+    end = first_sample_of_frame(first_frame + num_frames - 1, opts) + frame_length
+    padded_wave = reflect_pad_wave(wave, begin, end, sample_offset, num_samples)
+    wave_view = np.lib.stride_tricks.as_strided(padded_wave,
+                                                shape=(num_frames, frame_length),
+                                                strides=(frame_shift * padded_wave.strides[0],
+                                                         padded_wave.strides[0]),
+                                                writeable=False)
+    windows[:, :frame_length] = wave_view
+    return windows
+
+
+def extract_windows(wave: np.ndarray,
+                    opts: FrameExtractionOptions,
+                    window_function: FeatureWindowFunction,
+                    compute_log_energy=False,
+                    sample_offset=0,
+                    first_frame=0,
+                    num_frames=None,
+                    num_samples=None,
+                    workspace: FeatureWorkspace = None):
+    """
+        Extract all the frames of the wave into a (num_frames, padded_window_size) matrix in one pass,
+        which gives the same result as calling `extract_window` for each frame.
+        The wave is reflect-padded once and the frames are read by a strided view of it.
+        For the online extraction, the wave holds the samples starting at sample_offset of the whole wave,
+        only the frames [first_frame, first_frame + num_frames) are extracted and
+        num_samples is the length of the whole wave used by the reflection at the end.
+        The windows are a view of the workspace buffer "windows" if workspace is given.
+        Return the windows and the log-energy pre-window (None if compute_log_energy is False)
+    """
+    assert sample_offset >= 0 and wave.shape[0] != 0
+
+    if num_samples is None:
+        num_samples = sample_offset + wave.shape[0]
+    if num_frames is None:
+        num_frames = compute_num_frames(num_samples, opts) - first_frame
+    windows = get_buffer(workspace, "windows", num_frames, opts.get_padded_window_size(), opts.get_dtype())
+    if num_frames == 0:
+        return windows, (np.zeros((0,), dtype=windows.dtype) if compute_log_energy else None)
+
+    fill_windows(windows, wave, opts, sample_offset, first_frame, num_samples)
+    _, log_energy_pre_window = process_windows(opts, window_function, windows[:, :opts.get_win_size()],
+                                               compute_log_energy)
+    return windows, log_energy_pre_window
+
+
+def extract_log_energies(wave: np.ndarray,
+                         opts: FrameExtractionOptions,
+                         sample_offset=0,
+                         first_frame=0,
+                         num_frames=None,
+                         num_samples=None,
+                         workspace: FeatureWorkspace = None) -> np.ndarray:
+    """
+        The raw log energy of each frame, the same as the log-energy pre-window of `extract_windows`,
+        the frames are copied without the fft padding and only the dc offset is removed before the energy,
+        the window function, the preemphasis and the spectral stages are skipped.
+        See `extract_windows` for the arguments
+    """
+    assert sample_offset >= 0 and wave.shape[0] != 0
+
+    if num_samples is None:
+        num_samples = sample_offset + wave.shape[0]
+    if num_frames is None:
+        num_frames = compute_num_frames(num_samples, opts) - first_frame
+    if num_frames == 0:
+        return np.zeros((0,), dtype=opts.get_dtype())
+
+    frames = get_buffer(workspace, "energy_frames", num_frames, opts.get_win_size(), opts.get_dtype())
+    fill_windows(frames, wave, opts, sample_offset, first_frame, num_samples)
+    if opts.remove_dc_offset:
+        remove_dc_offset_matrix(frames)
+    return compute_log_energy_pre_window(frames)
+
+
+def extract_windows_batch(waves: List[np.ndarray],
+                          opts: FrameExtractionOptions,
+                          window_function: FeatureWindowFunction,
+                          compute_log_energy=False,
+                          workspace: FeatureWorkspace = None):
+    """
+        Extract the frames of all the waves into one (total_num_frames, padded_window_size) matrix,
+        the frames of the i-th wave are the rows [frame_offsets[i], frame_offsets[i + 1]).
+        Every stage after the framing works row by row, so the frames of the waves are stacked
+        without padding them to the same length.
+        Return the windows, the log-energy pre-window (None if compute_log_energy is False) and the frame_offsets
+    """
+    num_frames = [compute_num_frames(wave.shape[0], opts) if wave.shape[0] != 0 else 0 for wave in waves]
+    frame_offsets = np.concatenate([[0], np.cumsum(num_frames, dtype=np.int64)])
+    windows = get_buffer(workspace, "windows", frame_offsets[-1], opts.get_padded_window_size(), opts.get_dtype())
+
+    for wave, begin, end in zip(waves, frame_offsets[:-1], frame_offsets[1:]):
+        if end > begin:
+            fill_windows(windows[begin: end], wave, opts)
+
+    _, log_energy_pre_window = process_windows(opts, window_function, windows[:, :opts.get_win_size()],
+                                               compute_log_energy)
+    return windows, log_energy_pre_window, frame_offsets
@@ -0,0 +1,58 @@
+"""
+    Buffers reused by the feature extraction across the utterances
+"""
+from typing import Dict
+
+import numpy as np
+
+# a buffer grows at least by this factor, so a job with slowly growing utterances reallocates a few times only
+WORKSPACE_GROWTH = 1.5
+
+
+class FeatureWorkspace(object):
+    """
+        Named buffers which keep the largest number of rows asked so far,
+        `get` returns a view of the first rows, which is overwritten by the next call with the same name.
+        The buffers are allocated with zeros and the callers rely on the columns they never write staying zero
+        (the fft padding of the windows), so a workspace must not be shared by two threads
+    """
+
+    def __init__(self):
+        self.buffers: Dict[str, np.ndarray] = dict()
+
+    def get(self, name, num_rows, num_cols=None, dtype=np.float64) -> np.ndarray:
+        """
+            Return a (num_rows, num_cols) view of the buffer name, or (num_rows,) if num_cols is None
+        """
+        dtype = np.dtype(dtype)
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape[0] < num_rows or buffer.shape[1:] != self._tail(num_cols) \
+                or buffer.dtype != dtype:
+            capacity = num_rows
+            if buffer is not None and buffer.shape[1:] == self._tail(num_cols) and buffer.dtype == dtype:
+                capacity = max(num_rows, int(buffer.shape[0] * WORKSPACE_GROWTH))
+            # drop the old buffer before allocating the new one, which keeps the peak memory lower
+            self.buffers.pop(name, None)
+            buffer = np.zeros((capacity,) + self._tail(num_cols), dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer[:num_rows]
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def clear(self):
+        self.buffers.clear()
+
+    @staticmethod
+    def _tail(num_cols):
+        return () if num_cols is None else (num_cols,)
+
+
+def get_buffer(workspace: FeatureWorkspace, name, num_rows, num_cols=None, dtype=np.float64) -> np.ndarray:
+    """
+        The buffer name of the workspace, or a new zero array if there is no workspace
+    """
+    if workspace is None:
+        shape = (num_rows,) if num_cols is None else (num_rows, num_cols)
+        return np.zeros(shape, dtype=dtype)
+    return workspace.get(name, num_rows, num_cols, dtype)
@@ -8,19 +8,47 @@ class FeatureWriter(object):
 
     def __init__(self,
                  data_path,
-                 split_num):
+                 split_num,
+                 shard_index=None,
+                 name="feats",
+                 item_ndim=2,
+                 dtype=None):
+        """
+            shard_index: write only the shard_index-th of the split_num archives and `feats.{shard_index + 1}.scp`,
+                the scp fragments of all the shards should be merged by `merge_scp` at the end
+            name: the scp is `{name}.scp`, the archives are `feature_*.ark` for "feats" and `{name}_*.ark` otherwise
+            item_ndim: 2 for the matrices, 1 for the per-frame vectors like the vad,
+                an item with one more dimension holds the items of the channels of a multi-channel wave
+            dtype: cast the items to dtype before writing, e.g. np.float32 for the compact "FV" vectors
+        """
         self.data_path = data_path
+        self.shard_index = shard_index
+        self.name = name
+        self.item_ndim = item_ndim
+        self.dtype = dtype
         self.holder = MatrixHolder(mode="wb")
-        self.writer = ArchiveProvider(data_path, split_num=split_num)
+        self.writer = ArchiveProvider(data_path, split_num=split_num, shard_index=shard_index,
+                                      feature_name="feature" if name == "feats" else name)
 
     def write(self, utt_id, utt_matrix):
+        if utt_matrix.ndim == self.item_ndim + 1:
+            # the items of a multi-channel wave, e.g. (num_channels, num_frames, dim) features, one for each channel
+            for channel, channel_matrix in enumerate(utt_matrix):
+                self.write(f"{utt_id}-{channel}", channel_matrix)
+            return
+        if self.dtype is not None:
+            utt_matrix = utt_matrix.astype(self.dtype, copy=False)
         record = self.holder.write(self.writer.provide(), utt_id, utt_matrix)
         self.writer.record(utt_id, record)
 
     def flush(self):
-        scp_path = os.path.join(self.data_path, "feats.scp")
+        scp_path = os.path.join(self.data_path, self.get_scp_name())
         self.writer.save(scp_path)
+        return scp_path
+
+    def get_scp_name(self):
+        return f"{self.name}.scp" if self.shard_index is None else f"{self.name}.{self.shard_index + 1}.scp"
 
     def __del__(self):
         self.flush()
-        del self.holder
\ No newline at end of file
+        del self.holder
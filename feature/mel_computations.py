@@ -1,5 +1,7 @@
+from functools import lru_cache
 from typing import List, Tuple
 import numpy as np
+from scipy.sparse import csr_matrix
 
 from feature.feature_window import FrameExtractionOptions
 from feature.feature_config import OptionsParser
@@ -13,10 +15,14 @@ def mel2hz(mel):
     return 700 * (np.exp(mel / 1127.) - 1)
 
 
-def compute_lifter_coeffs(Q, coeffs: np.ndarray) -> np.ndarray:
-    for i in range(coeffs.shape[0]):
-        coeffs[i] = 1.0 + 0.5 * Q * np.sin(np.pi * i / Q)
-    return coeffs
+# Each fft bin is covered by at most two triangle filters, so the density of the filter bank matrix
+# is about 2 / num_bins and the CSR product wins once the matrix is not tiny
+SPARSE_MIN_NUM_BINS = 20
+SPARSE_MIN_NUM_FFT_BINS = 256
+
+
+def use_sparse_filter_bank(num_bins, num_fft_bins) -> bool:
+    return num_bins >= SPARSE_MIN_NUM_BINS and num_fft_bins >= SPARSE_MIN_NUM_FFT_BINS
 
 
 class MelBanksOptions(object):
@@ -35,6 +41,73 @@ class MelBanksOptions(object):
         self.high_freq = option_parser.get("high_freq", 7600.0, type_function=np.float)
 
 
+# Number of distinct filter banks kept by `compute_mel_banks`, the least recently used one is dropped first
+MEL_BANKS_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=MEL_BANKS_CACHE_SIZE)
+def compute_mel_banks(sample_freq, window_length_padded, num_bins, low_freq, high_freq, dtype=np.float64):
+    """
+        Compute the center frequencies, the bins and the filter bank operator of the mel banks,
+        the result is shared by all the MelBanks with the same options, so never modify it in place.
+        The weights are computed in float64, only the filter bank operator is cast to dtype
+    """
+    assert num_bins >= 3, "Must have at least 3 mel bins"
+    assert window_length_padded % 2 == 0  # I think this is unnecessary
+    num_fft_bins = window_length_padded // 2
+
+    nyquist = 0.5 * sample_freq  # nyquist theory
+    high_freq = high_freq if high_freq > 0 else nyquist + high_freq
+
+    if low_freq < 0.0 or low_freq >= nyquist or high_freq <= 0.0 or high_freq > nyquist or high_freq <= low_freq:
+        raise ValueError(
+            f"Bad values in options: low-freq {low_freq} and high-freq {high_freq} vs. nyquist {nyquist}")
+
+    fft_bin_width = sample_freq / window_length_padded
+    mel_low_freq = hz2mel(low_freq)
+    mel_high_freq = hz2mel(high_freq)
+    mel_freq_delta = (mel_high_freq - mel_low_freq) / (num_bins + 1)
+
+    # (num_bins, 1) edges of the triangles against the (num_fft_bins,) mel frequencies of the fft bins
+    bin_index = np.arange(num_bins)[:, None]
+    left_mel = mel_low_freq + bin_index * mel_freq_delta
+    center_mel = mel_low_freq + (bin_index + 1) * mel_freq_delta
+    right_mel = mel_low_freq + (bin_index + 2) * mel_freq_delta
+    mel = hz2mel(fft_bin_width * np.arange(num_fft_bins))
+
+    center_freqs = mel2hz(center_mel[:, 0])
+    center_freqs.flags.writeable = False
+
+    weights = np.where(mel <= center_mel,
+                       (mel - left_mel) / (center_mel - left_mel),
+                       (right_mel - mel) / (right_mel - center_mel))
+    in_bin = np.logical_and(left_mel < mel, mel < right_mel)
+    assert np.all(np.any(in_bin, axis=1)), "You may have set --num-mel-bins too large"
+
+    filter_bank_matrix = np.zeros((num_bins, num_fft_bins + 1))
+    filter_bank_matrix[:, :num_fft_bins] = np.where(in_bin, weights, 0.0)
+
+    bins: List[Tuple[int, np.ndarray]] = list()
+    first_indices = np.argmax(in_bin, axis=1)
+    last_indices = num_fft_bins - 1 - np.argmax(in_bin[:, ::-1], axis=1)
+    for bin, (first_index, last_index) in enumerate(zip(first_indices, last_indices)):
+        this_bin = filter_bank_matrix[bin, first_index: last_index + 1].copy()
+        this_bin.flags.writeable = False
+        bins.append((int(first_index), this_bin))
+
+    # the filter bank operator, dense or CSR
+    if use_sparse_filter_bank(num_bins, num_fft_bins):
+        filter_bank = csr_matrix(filter_bank_matrix, dtype=dtype)
+        filter_bank.data.flags.writeable = False
+        filter_bank.indices.flags.writeable = False
+        filter_bank.indptr.flags.writeable = False
+    else:
+        filter_bank = filter_bank_matrix.astype(dtype)
+        filter_bank.flags.writeable = False
+
+    return center_freqs, tuple(bins), filter_bank
+
+
 class MelBanks(object):
     def __init__(self,
                  opts: MelBanksOptions = None,
@@ -45,68 +118,32 @@ class MelBanks(object):
         self.opts = opts
         self.frame_opts = frame_opts
 
-        num_bins = opts.num_bins
-        assert num_bins >= 3, "Must have at least 3 mel bins"
-        sample_freq = frame_opts.samp_freq
-        window_length_padded = frame_opts.get_padded_window_size()
-
-        assert window_length_padded % 2 == 0  # I think this is unnecessary
-        num_fft_bins = window_length_padded // 2
-
-        nyquist = 0.5 * sample_freq  # nyquist theory
-        low_freq = opts.low_freq
-        high_freq = opts.high_freq if opts.high_freq > 0 else nyquist + opts.high_freq
-
-        if low_freq < 0.0 or low_freq >= nyquist or high_freq <= 0.0 or high_freq > nyquist or high_freq <= low_freq:
-            raise ValueError(
-                f"Bad values in options: low-freq {low_freq} and high-freq {high_freq} vs. nyquist {nyquist}")
-
-        fft_bin_width = sample_freq / window_length_padded
-        mel_low_freq = hz2mel(low_freq)
-        mel_high_freq = hz2mel(high_freq)
-        mel_freq_delta = (mel_high_freq - mel_low_freq) / (num_bins + 1)
-
-        self.center_freqs = np.zeros((num_bins,))
-        self.bins: List[Tuple[int, np.ndarray]] = list()  # self.bins = List(Tuple(int, List))
-
-        for bin in range(num_bins):
-            left_mel = mel_low_freq + bin * mel_freq_delta
-            center_mel = mel_low_freq + (bin + 1) * mel_freq_delta
-            right_mel = mel_low_freq + (bin + 2) * mel_freq_delta
-
-            self.center_freqs[bin] = mel2hz(center_mel)
-            this_bin = np.zeros((num_fft_bins,))
-
-            first_index = -1
-            last_index = -1
-            for i in range(num_fft_bins):
-                freq = float(fft_bin_width * i)
-                mel = hz2mel(freq)
-
-                if left_mel < mel < right_mel:
-                    if mel <= center_mel:
-                        weight = (mel - left_mel) / (center_mel - left_mel)
-                    else:
-                        weight = (right_mel - mel) / (right_mel - center_mel)
-                    this_bin[i] = weight
-                    if first_index == -1:
-                        first_index = i
-                    last_index = i
-
-            assert first_index != -1 and last_index >= first_index, "You may have set --num-mel-bins too large"
-            self.bins.append((first_index, np.copy(this_bin[first_index: last_index + 1])))
+        center_freqs, bins, filter_bank = compute_mel_banks(frame_opts.samp_freq,
+                                                            frame_opts.get_padded_window_size(),
+                                                            opts.num_bins,
+                                                            opts.low_freq,
+                                                            opts.high_freq,
+                                                            frame_opts.get_dtype())
+        self.center_freqs = center_freqs
+        self.bins: List[Tuple[int, np.ndarray]] = list(bins)
+        # the (num_bins, num_fft_bins + 1) filter bank operator, dense or CSR
+        self.filter_bank = filter_bank
 
     def compute(self, power_spectrum: np.ndarray) -> np.ndarray:
-        num_bins = len(self.bins)
-        mel_energies_out = np.zeros((num_bins,))
-
-        for i in range(num_bins):
-            offset = self.bins[i][0]
-            v = self.bins[i][1]
-            mel_energies_out[i] = np.dot(v, power_spectrum[offset: offset + v.shape[0]])
-            # print(f"mel-banks compute {i}: offset: {offset}, v.dim: {v.shape[0]}, mel_energies_out: {mel_energies_out[i]} v:\n{v}")
-
-        return mel_energies_out
+        return self.apply(power_spectrum[None, :])[0]
+
+    def apply(self, power_spectra: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+            Apply the filter bank to all the frames at once,
+            power_spectra is a (num_frames, num_fft_bins + 1) matrix and the result is (num_frames, num_bins),
+            the result is written to out if it is given (the CSR product still allocates its own result)
+        """
+        if out is None:
+            return self.filter_bank.dot(power_spectra.T).T
+        if isinstance(self.filter_bank, np.ndarray):
+            return np.matmul(power_spectra, self.filter_bank.T, out=out)
+        np.copyto(out, self.filter_bank.dot(power_spectra.T).T)
+        return out
 
     def get_bins_matrix(self):
         num_bins = len(self.bins)
@@ -25,11 +25,23 @@ class VadEnergyOptions(object):
 
 
 def compute_vad_energy(opts: VadEnergyOptions, feature: np.ndarray) -> np.ndarray:
-    feat_length = feature.shape[0]
+    """
+        The energy vad of the features whose column 0 is the log energy (mfcc or fbank with use_energy, stft)
+    """
+    if feature.shape[0] == 0:
+        logging.warning("Empty features")
+        return np.array([])
+    return compute_vad_from_log_energy(opts, feature[:, 0])
+
+
+def compute_vad_from_log_energy(opts: VadEnergyOptions, log_energy: np.ndarray) -> np.ndarray:
+    """
+        The energy vad of the per-frame log energy, 1.0 for the voiced frames and 0.0 for the others
+    """
+    feat_length = log_energy.shape[0]
     if feat_length == 0:
-        logging.warning(f"Empty features")
+        logging.warning("Empty features")
         return np.array([])
-    log_energy = feature[:, 0]
     energy_threshold = opts.vad_energy_threshold
 
     if opts.vad_energy_mean_scale != 0.0:
@@ -39,21 +51,14 @@ def compute_vad_energy(opts: VadEnergyOptions, feature: np.ndarray) -> np.ndarra
     assert opts.vad_frames_context >= 0
     assert 0.0 < opts.vad_proportion_threshold < 1.0
 
-    output_voiced = []
-    for t in range(feat_length):
-        log_energy_data = log_energy[t]
-        num_count = 0
-        den_count = 0
-        context = opts.vad_frames_context
-        for t2 in range(t - context, t + context):
-            if 0 <= t2 < feat_length:
-                den_count += 1
-                if log_energy_data[t2] > energy_threshold:
-                    num_count += 1
-
-        if num_count >= den_count * opts.vad_proportion_threshold:
-            output_voiced.append(1.0)
-        else:
-            output_voiced.append(0.0)
-    return np.array(output_voiced)
+    # the number of voiced frames in the window [t - context, t + context] of every frame t (inside the utterance),
+    # as the differences of the prefix sums of the voiced frames
+    context = opts.vad_frames_context
+    voiced_prefix = np.concatenate([[0], np.cumsum(log_energy > energy_threshold, dtype=np.int64)])
+    t = np.arange(feat_length)
+    window_start = np.maximum(t - context, 0)
+    window_end = np.minimum(t + context + 1, feat_length)
+    num_count = voiced_prefix[window_end] - voiced_prefix[window_start]
+    den_count = window_end - window_start
 
+    return np.where(num_count >= den_count * opts.vad_proportion_threshold, 1.0, 0.0)
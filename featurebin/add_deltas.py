@@ -0,0 +1,51 @@
+import os
+import argparse
+import logging
+
+from feature.feature_reader import FeatureReader
+from feature.feature_writer import FeatureWriter
+from feature.feature_config import OptionsParser
+from feature.feature_functions import DeltaFeatureOptions, DeltaFeature
+
+parser = argparse.ArgumentParser(description="The tool to add the deltas to the features, like Kaldi add-deltas")
+parser.add_argument("--data_path",
+                    required=True,
+                    help="The data_path of the features, feats.scp should be included")
+parser.add_argument("--save_path",
+                    required=True,
+                    help="The save_path to save the features with deltas, the building details see the comments please")
+parser.add_argument("--config_file",
+                    required=True,
+                    help="The config file with delta_order and delta_window")
+parser.add_argument("--config_section",
+                    default="default",
+                    help="The config section, default = [default]")
+
+
+def main(args):
+    data_path = args.data_path
+    save_path = args.save_path
+
+    option_parser = OptionsParser(conf_file=args.config_file, conf_section=args.config_section)
+    delta_opts = DeltaFeatureOptions()
+    delta_opts.register(option_parser)
+    delta_feature = DeltaFeature(delta_opts)
+
+    feats_scp = os.path.join(data_path, "feats.scp")
+    feature_reader = FeatureReader(feats_scp)
+    feature_writer = FeatureWriter(save_path, split_num=1)
+
+    for (utt_id, utt_feat) in feature_reader:
+        if utt_feat.shape[0] == 0:
+            logging.warning(f"Empty feature matrix for utterance {utt_id}")
+            continue
+        result = delta_feature.process_matrix(utt_feat)
+        print(f"utt_id = {utt_id}, result.shape = {result.shape}")
+        feature_writer.write(utt_id, result)
+    feature_writer.flush()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    logging.info(f"{args}")
+    main(args)
@@ -0,0 +1,88 @@
+import argparse
+import logging
+
+from feature.feature_common import FusedFeatureExtractor
+from feature.feature_config import OptionsParser
+from feature.feature_writer import FeatureWriter
+from feature.feature_parallel import compute_features_parallel
+from audio.wav_reader import WavReader
+
+parser = argparse.ArgumentParser(description="The tool to compute several features in one pass over the wav.scp")
+parser.add_argument("--data_path",
+                    required=True,
+                    help="The data_path to extract features, wav.scp should be included")
+parser.add_argument("--feature_types",
+                    required=True,
+                    nargs="+",
+                    choices=["mfcc", "fbank", "stft"],
+                    help="The feature types to compute, the same type can be given several times with different configs")
+parser.add_argument("--save_paths",
+                    required=True,
+                    nargs="+",
+                    help="The save_path of each feature type, each one gets its own *.ark and feats.scp")
+parser.add_argument("--config_files",
+                    required=True,
+                    nargs="+",
+                    help="The config file of each feature type, or one config file for all of them")
+parser.add_argument("--config_sections",
+                    nargs="+",
+                    default=["default"],
+                    help="The config section of each feature type, or one section for all of them")
+parser.add_argument("--nj",
+                    type=int,
+                    default=1,
+                    help="The number of processes, each one writes its own ark and the feats.scp are merged")
+parser.add_argument("--batch_size",
+                    type=int,
+                    default=1,
+                    help="The number of utterances computed together, larger is faster for short utterances")
+parser.add_argument("--compute_vad",
+                    action="store_true",
+                    help="Also write the energy vad (vad_* options in the first config) "
+                         "to the first save_path as vad.scp")
+
+
+def expand_args(values, num, name):
+    if len(values) == 1:
+        return values * num
+    if len(values) != num:
+        raise ValueError(f"The number of {name} should be 1 or {num}, but gets {len(values)}")
+    return values
+
+
+def main(args):
+    data_path = args.data_path
+    feature_types = args.feature_types
+    num_features = len(feature_types)
+    if len(args.save_paths) != num_features:
+        raise ValueError(f"The number of save_paths should be {num_features}, but gets {len(args.save_paths)}")
+    config_files = expand_args(args.config_files, num_features, "config_files")
+    config_sections = expand_args(args.config_sections, num_features, "config_sections")
+
+    if args.nj > 1 or args.batch_size > 1 or args.compute_vad:
+        vad_config = (config_files[0], config_sections[0]) if args.compute_vad else None
+        compute_features_parallel(list(zip(feature_types, config_files, config_sections)),
+                                  data_path, args.save_paths, args.nj, args.batch_size, vad_config)
+        return
+
+    wav_reader = WavReader(data_path)
+    feature_configs = [(feature_type, OptionsParser(conf_file=config_file, conf_section=config_section))
+                       for feature_type, config_file, config_section in zip(feature_types,
+                                                                           config_files,
+                                                                           config_sections)]
+    feature_extractor = FusedFeatureExtractor(feature_configs, return_views=True)
+    feature_writers = [FeatureWriter(save_path, split_num=1) for save_path in args.save_paths]
+
+    for utt_id, (wav, sample_rate) in wav_reader:
+        results = feature_extractor.compute_features(wav, sample_rate)
+        print(f"utt_id = {utt_id}, result.shape = {[result.shape for result in results]}")
+        for feature_writer, result in zip(feature_writers, results):
+            feature_writer.write(utt_id, result)
+    for feature_writer in feature_writers:
+        feature_writer.flush()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    logging.info(f"{args}")
+    main(args)
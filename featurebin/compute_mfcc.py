@@ -4,6 +4,7 @@ import logging
 from feature.feature_common import FeatureExtractor
 from feature.feature_config import OptionsParser
 from feature.feature_writer import FeatureWriter
+from feature.feature_parallel import compute_features_parallel
 from audio.wav_reader import WavReader
 
 parser = argparse.ArgumentParser(description="The tool to compute the mfcc")
@@ -18,6 +19,17 @@ parser.add_argument("--config_file",
                     help="The config file to extract features")
 parser.add_argument("--config_section",
                     help="The config section")
+parser.add_argument("--nj",
+                    type=int,
+                    default=1,
+                    help="The number of processes, each one writes its own ark and the feats.scp are merged")
+parser.add_argument("--batch_size",
+                    type=int,
+                    default=1,
+                    help="The number of utterances computed together, larger is faster for short utterances")
+parser.add_argument("--compute_vad",
+                    action="store_true",
+                    help="Also write the energy vad (vad_* options in the config) to the save_path as vad.scp")
 
 
 def main(args):
@@ -26,9 +38,15 @@ def main(args):
     config_file = args.config_file
     config_section = args.config_section
 
+    if args.nj > 1 or args.batch_size > 1 or args.compute_vad:
+        vad_config = (config_file, config_section) if args.compute_vad else None
+        compute_features_parallel([("mfcc", config_file, config_section)], data_path, [save_path],
+                                  args.nj, args.batch_size, vad_config)
+        return
+
     wav_reader = WavReader(data_path)
     option_parser = OptionsParser(conf_file=config_file, conf_section=config_section)
-    feature_extractor = FeatureExtractor(feature_type="mfcc", option_parser=option_parser)
+    feature_extractor = FeatureExtractor(feature_type="mfcc", option_parser=option_parser, return_views=True)
     feature_writer = FeatureWriter(save_path, split_num=1)
 
     for utt_id, (wav, sample_rate) in wav_reader:
@@ -4,15 +4,17 @@ import logging
 
 import numpy as np
 
+from feature.feature_common import EnergyExtractor
 from feature.feature_reader import FeatureReader
 from feature.feature_writer import FeatureWriter
 from feature.feature_config import OptionsParser
-from feature.voice_activity_detection import VadEnergyOptions, compute_vad_energy
+from feature.voice_activity_detection import VadEnergyOptions, compute_vad_from_log_energy
+from audio.wav_reader import WavReader
 
 parser = argparse.ArgumentParser(description="The tool to compute the vad")
 parser.add_argument("--data_path",
                     required=True,
-                    help="The data_path to compute vad, feats.scp should be included")
+                    help="The data_path to compute vad, feats.scp (or wav.scp with --from_wav) should be included")
 parser.add_argument("--save_path",
                     required=True,
                     help="The save_path to save the vad, the building details see the comments please")
@@ -21,6 +23,35 @@ parser.add_argument("--config_file",
                     help="The config file to extract vad")
 parser.add_argument("--config_section",
                     help="The config section, default = [default]")
+parser.add_argument("--output_name",
+                    choices=["feats", "vad"],
+                    default="feats",
+                    help="The name of the written scp and arks, feats writes feats.scp and feature_*.ark (default), "
+                         "vad writes vad.scp and vad_*.ark like --compute_vad of the extraction tools")
+parser.add_argument("--from_wav",
+                    action="store_true",
+                    help="Compute the raw log energy straight from the wav.scp (frame options in the config) "
+                         "instead of reading the column 0 of the feats.scp, no features are needed")
+
+
+def read_log_energies(data_path, option_parser: OptionsParser, from_wav):
+    """
+        Yield (utt_id, log_energy) from the column 0 of the features, or computed from the waves if from_wav,
+        the channels of a stacked multi-channel wave are yielded as <utt_id>-<channel> like the features
+    """
+    if not from_wav:
+        for (utt_id, utt_feat) in FeatureReader(os.path.join(data_path, "feats.scp")):
+            yield utt_id, (utt_feat[:, 0] if utt_feat.shape[0] != 0 else np.array([]))
+        return
+
+    energy_extractor = EnergyExtractor(option_parser)
+    for utt_id, (wav, sample_rate) in WavReader(data_path):
+        log_energy = energy_extractor.compute_features(wav, sample_rate)
+        if log_energy.ndim == 2:
+            for channel, channel_energy in enumerate(log_energy):
+                yield f"{utt_id}-{channel}", channel_energy
+        else:
+            yield utt_id, log_energy
 
 
 def main(args):
@@ -33,22 +64,20 @@ def main(args):
     vad_opts = VadEnergyOptions()
     vad_opts.register(option_parser)
 
-    feats_scp = os.path.join(data_path, "feats.scp")
-    feature_reader = FeatureReader(feats_scp)
-    vad_writer = FeatureWriter(save_path, split_num=1)
+    vad_writer = FeatureWriter(save_path, split_num=1, name=args.output_name, item_ndim=1, dtype=np.float32)
 
     num_done = 0
     num_err = 0
     num_unvoiced = 0
     tot_length = 0.0
     tot_decision = 0.0
-    for (utt_id, utt_feat) in feature_reader:
-        if utt_feat.shape[0] == 0:
+    for (utt_id, log_energy) in read_log_energies(data_path, option_parser, args.from_wav):
+        if log_energy.shape[0] == 0:
             logging.warning(f"Empty feature matrix for utterance {utt_id}")
             num_err += 1
             continue
 
-        vad_result = compute_vad_energy(vad_opts, utt_feat)
+        vad_result = compute_vad_from_log_energy(vad_opts, log_energy)
         vad_sum = np.sum(vad_result)
         if vad_sum == 0.0:
             logging.warning(f"No frames were judged voiced for utterance {utt_id}")
@@ -61,6 +90,7 @@ def main(args):
 
         if vad_sum != 0.0:
             vad_writer.write(utt_id, vad_result)
+    vad_writer.flush()
 
     logging.info(f"Applied energy based voice activity detection "
                  f"{num_done} utterances successfully"
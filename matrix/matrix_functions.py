@@ -16,17 +16,20 @@ def compute_dct_matrix(M: np.ndarray):
     assert K > 0
     assert N > 0
 
-    normalizer = np.sqrt(1.0 / N)
-    for j in range(N):
-        M[0, j] = normalizer
+    M[0, :] = np.sqrt(1.0 / N)
 
     normalizer = np.sqrt(2.0 / N)
-    for k in range(1, K):
-        for n in range(N):
-            M[k, n] = normalizer * np.cos(np.pi / N * (n + 0.5) * k)
+    k = np.arange(1, K)[:, None]
+    n = np.arange(N)[None, :]
+    M[1:, :] = normalizer * np.cos(np.pi / N * (n + 0.5) * k)
     return M
 
 
+def compute_lifter_coeffs(Q, coeffs: np.ndarray) -> np.ndarray:
+    coeffs[:] = 1.0 + 0.5 * Q * np.sin(np.pi * np.arange(coeffs.shape[0]) / Q)
+    return coeffs
+
+
 def main():
     num_bins = 13
     M = np.zeros((num_bins, num_bins))
@@ -1,6 +1,9 @@
 from base.io_functions import *
 import numpy as np
 
+# The header of a compressed matrix: {min_value, range, num_rows, num_cols}
+COMPRESS_HEADER_STRUCT = struct.Struct("=ffii")
+
 
 def read_float_vec(fd, direct_access=False):
     if direct_access:
@@ -9,20 +12,24 @@ def read_float_vec(fd, direct_access=False):
     # print(f"\tType of the common vector: {vec_type}")
     if vec_type not in ["FV", "DV"]:
         raise RuntimeError(f"Unknown matrix type in Kaldi: {vec_type}")
-    float_size = 4 if vec_type == 'FV' else 8
+    return read_float_vec_data(fd, vec_type)
+
+
+def read_float_vec_data(fd, vec_type):
+    """
+        Read the vector after its type token
+    """
     float_type = np.float32 if vec_type == "FV" else np.float64
     dim = read_int32(fd)
     # print(f"\tDim of the common vector: {dim}")
-    vec_data = fd.read(float_size * dim)
-    return np.fromstring(vec_data, dtype=float_type)
+    return read_into_array(fd, dim, float_type)
 
 
 def read_int32_vec(fd, direct_access=False):
     if direct_access:
         expect_binary(fd)
     vec_size = read_int32(fd)
-    vec = np.array([read_int32(fd) for _ in range(vec_size)], dtype=np.int32)
-    return vec
+    return read_int32_array(fd, vec_size)
 
 
 def read_common_mat(fd):
@@ -30,14 +37,18 @@ def read_common_mat(fd):
     # print(f"\tType of the common matrix: {mat_type}")
     if mat_type not in ["FM", "DM"]:
         raise RuntimeError(f"Unknown matrix type in kaldi: {mat_type}")
-    float_size = 4 if mat_type == 'FM' else 8
+    return read_common_mat_data(fd, mat_type)
+
+
+def read_common_mat_data(fd, mat_type):
+    """
+        Read the matrix after its type token, the data is read straight into the returned matrix
+    """
     float_type = np.float32 if mat_type == 'FM' else np.float64
-    num_rows = read_int32(fd)
-    num_cols = read_int32(fd)
+    num_rows, num_cols = read_int32_pair(fd)
     # print(f"\tSize of the common matrix: {num_rows} x {num_cols}")
-    mat_data = fd.read(float_size * num_cols * num_rows)
-    mat = np.fromstring(mat_data, dtype=float_type)
-    return mat.reshape(num_rows, num_cols)
+    return read_into_array(fd, (num_rows, num_cols), float_type)
+
 
 def uncompress(cdata, cps_type, head):
     """
@@ -62,11 +73,11 @@ def uncompress(cdata, cps_type, head):
         assert len(cdata) == num_cols * (8 + num_rows)
         chead, cmain = cdata[:8 * num_cols], cdata[8 * num_cols:]
         # type uint16
-        pch = np.fromstring(chead, dtype=np.uint16).astype(np.float32)
+        pch = np.frombuffer(chead, dtype=np.uint16).astype(np.float32)
         pch = np.transpose(pch.reshape(num_cols, 4))
         pch = pch * prange / 65535.0 + min_val
         # type uint8
-        uint8 = np.fromstring(cmain, dtype=np.uint8).astype(np.float32)
+        uint8 = np.frombuffer(cmain, dtype=np.uint8).astype(np.float32)
         uint8 = np.transpose(uint8.reshape(num_cols, num_rows))
         # precompute index
         le64_index = uint8 <= 64
@@ -80,34 +91,45 @@ def uncompress(cdata, cps_type, head):
     else:
         if cps_type == 'CM2':
             inc = float(prange / 65535.0)
-            uint_seq = np.fromstring(cdata, dtype=np.uint16).astype(np.float32)
+            uint_seq = np.frombuffer(cdata, dtype=np.uint16).astype(np.float32)
         else:
             inc = float(prange / 255.0)
-            uint_seq = np.fromstring(cdata, dtype=np.uint8).astype(np.float32)
+            uint_seq = np.frombuffer(cdata, dtype=np.uint8).astype(np.float32)
         mat = min_val + uint_seq.reshape(num_rows, num_cols) * inc
 
     return mat
 
 
+def compress_data_size(cps_type, num_rows, num_cols):
+    """
+        The bytes of the compressed data after the header
+    """
+    if cps_type == 'CM':
+        # 8: sizeof PerColHeader
+        return num_cols * (8 + num_rows)
+    elif cps_type == 'CM2':
+        return 2 * num_rows * num_cols
+    elif cps_type == 'CM3':
+        return num_rows * num_cols
+    throw_on_error(False, f'Unknown matrix compressing type: {cps_type}')
+
+
 def read_compress_mat(fd):
     cps_type = read_token(fd)
     # print(f'\tFollowing matrix type: {cps_type}')
-    head = struct.unpack('ffii', fd.read(16))
+    return read_compress_mat_data(fd, cps_type)
+
+
+def read_compress_mat_data(fd, cps_type):
+    """
+        Read and uncompress the matrix after its type token
+    """
+    head = COMPRESS_HEADER_STRUCT.unpack_from(read_exactly(fd, COMPRESS_HEADER_STRUCT.size))
     # print(f'\tCompress matrix header: {head}')
-    # 8: sizeof PerColHeader
     # head: {min_value, range, num_rows, num_cols}
-    num_rows, num_cols = head[2], head[3]
-    remain_size = 0
-    if cps_type == 'CM':
-        remain_size = num_cols * (8 + num_rows)
-    elif cps_type == 'CM2':
-        remain_size = 2 * num_rows * num_cols
-    elif cps_type == 'CM3':
-        remain_size = num_rows * num_cols
-    else:
-        throw_on_error(False, f'Unknown matrix compressing type: {cps_type}')
+    remain_size = compress_data_size(cps_type, head[2], head[3])
     # now uncompress it
-    compress_data = fd.read(remain_size)
+    compress_data = read_exactly(fd, remain_size)
     mat = uncompress(compress_data, cps_type, head)
     return mat
 
@@ -126,13 +148,47 @@ def read_float_mat(fd, direct_access=False):
 
 
 def read_float_mat_vec(fd, direct_access=False):
+    """
+        Read a vector or a (compressed) matrix, dispatched by its type token,
+        so the token is read once and nothing is peeked
+    """
     if direct_access:
         expect_binary(fd)
-    peek_type = peek_char(fd, num_chars=2)
-    if peek_type[-1] == "V":
-        return read_float_vec(fd, direct_access=False)
+    data_type = read_token(fd)
+    if data_type in ["FV", "DV"]:
+        return read_float_vec_data(fd, data_type)
+    elif data_type in ["FM", "DM"]:
+        return read_common_mat_data(fd, data_type)
+    elif data_type in ["CM", "CM2", "CM3"]:
+        return read_compress_mat_data(fd, data_type)
+    else:
+        # Kaldi have compress_matrix and sparse_matrix
+        raise RuntimeError(f"Unknown matrix or vector type in Kaldi: {data_type}")
+
+
+def read_float_mat_vec_from_buffer(buffer, offset=0):
+    """
+        Read a vector or a matrix at offset of the buffer, like a mmap of the ark at the offset of the scp.
+        The FM/DM/FV/DV data are not copied, they are views of the buffer (read-only for a read-only mmap),
+        the compressed matrices are uncompressed into new matrices
+    """
+    throw_on_error(buffer[offset: offset + 2] == b'\0B', f"Expect binary flag at offset {offset}")
+    data_type, offset = unpack_token(buffer, offset + 2)
+    if data_type in ["FV", "DV"]:
+        dim, offset = unpack_int32(buffer, offset)
+        shape = (dim,)
+    elif data_type in ["FM", "DM"]:
+        shape, offset = unpack_int32_pair(buffer, offset)
+    elif data_type in ["CM", "CM2", "CM3"]:
+        head = COMPRESS_HEADER_STRUCT.unpack_from(buffer, offset)
+        offset += COMPRESS_HEADER_STRUCT.size
+        remain_size = compress_data_size(data_type, head[2], head[3])
+        throw_on_error(offset + remain_size <= len(buffer), f"Expect {remain_size} bytes at offset {offset}")
+        return uncompress(buffer[offset: offset + remain_size], data_type, head)
     else:
-        return read_float_mat(fd, direct_access=False)
+        raise RuntimeError(f"Unknown matrix or vector type in Kaldi: {data_type}")
+    float_type = np.float32 if data_type[0] == "F" else np.float64
+    return np.frombuffer(buffer, dtype=float_type, count=int(np.prod(shape)), offset=offset).reshape(shape)
 
 
 def write_float_vec(fd, vec):
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import feature.feature_common as feature_common
+from feature.feature_parallel import compute_features_parallel
+from feature.feature_reader import FeatureReader
+from featurebin import compute_features
+
+BLOCK_CONFIG = """[default]
+dither = 0.0
+block_num_workers = {num_workers}
+block_min_duration = 1.0
+block_use_processes = {use_processes}
+"""
+
+
+def write_data(data_path, duration=3.0, samp_freq=16000):
+    os.makedirs(data_path)
+    wave = np.random.default_rng(0).uniform(-0.5, 0.5, int(duration * samp_freq))
+    wav_path = os.path.join(data_path, "long.wav")
+    sf.write(wav_path, wave, samp_freq, subtype="PCM_16")
+    with open(os.path.join(data_path, "wav.scp"), "w") as f:
+        f.write(f"long {wav_path}\n")
+
+
+def write_config(config_file, num_workers, use_processes=False):
+    with open(config_file, "w") as f:
+        f.write(BLOCK_CONFIG.format(num_workers=num_workers, use_processes=use_processes))
+
+
+def run_compute_features(data_path, save_paths, config_file):
+    args = compute_features.parser.parse_args(["--data_path", data_path,
+                                               "--feature_types", "mfcc", "fbank",
+                                               "--save_paths", *save_paths,
+                                               "--config_files", config_file])
+    compute_features.main(args)
+    return [dict(FeatureReader(os.path.join(save_path, "feats.scp"))) for save_path in save_paths]
+
+
+def test_compute_features_uses_blocks(tmp_path, monkeypatch):
+    data_path = str(tmp_path / "data")
+    write_data(data_path)
+    serial_config, block_config = str(tmp_path / "serial.ini"), str(tmp_path / "block.ini")
+    write_config(serial_config, num_workers=1)
+    write_config(block_config, num_workers=3)
+
+    block_calls = list()
+    compute_fused_block = feature_common._compute_fused_block
+
+    def counting_compute_fused_block(*args):
+        block_calls.append(args[3:5])
+        return compute_fused_block(*args)
+
+    monkeypatch.setattr(feature_common, "_compute_fused_block", counting_compute_fused_block)
+    serial = run_compute_features(data_path, [str(tmp_path / "serial_mfcc"), str(tmp_path / "serial_fbank")],
+                                  serial_config)
+    assert len(block_calls) == 0
+    blocks = run_compute_features(data_path, [str(tmp_path / "block_mfcc"), str(tmp_path / "block_fbank")],
+                                  block_config)
+
+    # one group of frame options, split into 3 blocks covering all the frames
+    num_frames = serial[0]["long"].shape[0]
+    assert len(block_calls) == 3
+    assert sorted(block_calls)[0][0] == 0 and sum(block_frames for _, block_frames in block_calls) == num_frames
+    # the fbank blocks are bit-identical, the mfcc dct is a BLAS matmul whose rounding may depend on the number of rows
+    serial_mfcc, serial_fbank = serial
+    block_mfcc, block_fbank = blocks
+    np.testing.assert_array_equal(block_fbank["long"], serial_fbank["long"])
+    np.testing.assert_allclose(block_mfcc["long"], serial_mfcc["long"], rtol=1e-6)
+
+
+def test_block_processes_rejected_with_nj(tmp_path):
+    data_path = str(tmp_path / "data")
+    write_data(data_path, duration=0.5)
+    config_file = str(tmp_path / "block.ini")
+    write_config(config_file, num_workers=2, use_processes=True)
+    with pytest.raises(ValueError):
+        compute_features_parallel([("mfcc", config_file, "default")], data_path, [str(tmp_path / "mfcc")], nj=2)
@@ -1,11 +1,11 @@
 import numpy as np
 import torch
 
-from feature.feature_window import FeatureWindowFunction, FrameExtractionOptions
+from feature.feature_window import FrameExtractionOptions
 from feature.feature_window import compute_num_frames, first_sample_of_frame
 from feature.mel_computations import MelBanksOptions, MelBanks
 from feature.feature_mfcc import MfccOptions
-from matrix.matrix_functions import compute_dct_matrix
+from feature.feature_tables import get_window_function, get_dct_matrix
 
 
 def init_preemph_matrix(frame_length_padded, preemph_coeff) -> np.ndarray:
@@ -15,12 +15,11 @@ def init_preemph_matrix(frame_length_padded, preemph_coeff) -> np.ndarray:
 
 
 def init_window_function(opts: FrameExtractionOptions, padding_size = None):
-    feature_window_function = FeatureWindowFunction(opts)
     if padding_size is None:
         padding_size = opts.get_win_size()
     assert padding_size >= opts.get_win_size()
     result = np.zeros((padding_size, ))
-    result[:opts.get_win_size()] = feature_window_function.get_window()
+    result[:opts.get_win_size()] = get_window_function(opts.window_type, opts.get_win_size(), opts.blackman_coeff)
     return result
 
 
@@ -30,10 +29,7 @@ def init_mel_banks(opts: MelBanksOptions, frame_opts: FrameExtractionOptions) ->
 
 
 def init_dct_matrix(opts:MfccOptions):
-    num_bins = opts.mel_opts.num_bins
-    dct_matrix = np.zeros((num_bins, num_bins))
-    dct_matrix = compute_dct_matrix(dct_matrix)
-    return dct_matrix[:opts.num_ceps, :num_bins].astype(np.float32)
+    return get_dct_matrix(opts.num_ceps, opts.mel_opts.num_bins).astype(np.float32)
 
 
 def wave_reflection_padding(wave_len, opts: FrameExtractionOptions) -> np.ndarray:
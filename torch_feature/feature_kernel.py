@@ -16,8 +16,7 @@ from base.math_util import epsilon
 from feature.feature_window import FrameExtractionOptions
 from torch_feature.feature_functions import *
 from feature.feature_mfcc import MfccOptions
-from matrix.matrix_functions import compute_dct_matrix
-from feature.mel_computations import compute_lifter_coeffs
+from feature.feature_tables import get_lifter_coeffs
 
 
 class Window(nn.Module):
@@ -120,8 +119,7 @@ class MfccFeature(nn.Module):
 
         self.lifter_coeffs = None
         if opts.cepstral_lifter != 0.0:
-            self.lifter_coeffs = np.zeros((opts.num_ceps,))
-            self.lifter_coeffs = compute_lifter_coeffs(opts.cepstral_lifter, self.lifter_coeffs)
+            self.lifter_coeffs = get_lifter_coeffs(opts.num_ceps, opts.cepstral_lifter).copy()
             self.lifter_coeffs = nn.Parameter(torch.from_numpy(self.lifter_coeffs), requires_grad=requires_grad)
 
         self.log_energy_floor = 0.0
@@ -1,12 +1,18 @@
 """
 
 """
+import mmap
 import os
+from collections import OrderedDict
 
 import numpy as np
 import soundfile as sf
 
 from matrix.matrix_io import read_float_mat_vec, write_float_mat_vec, write_token, write_binary_symbol
+from matrix.matrix_io import read_float_mat_vec_from_buffer
+
+# Number of arks kept mapped by a MmapMatrixHolder, the least recently read one is dropped first
+MMAP_POOL_SIZE = 16
 
 
 class SimpleTextHolder(object):
@@ -26,12 +32,22 @@ class WavHolder(object):
             raise ValueError(f"File {item} do not exist")
         wave, sample_rate = sf.read(item)
         wave *= (1 << 15)
+        if wave.ndim == 2:
+            # soundfile gives (num_samples, num_channels), keep each channel contiguous like WaveData
+            wave = np.ascontiguousarray(wave.T)
         return wave, sample_rate
 
     def write(self, item):
         raise NotImplementedError
 
 
+def parse_ark_address(script):
+    value = script.split(":")
+    if len(value) == 1:
+        raise ValueError(f"Unsupported scripts address format {script}")
+    return ":".join(value[0:-1]), int(value[-1])
+
+
 class MatrixHolder(object):
     def __init__(self, mode):
         self.file_handle_dict = dict()
@@ -54,10 +70,7 @@ class MatrixHolder(object):
         return ark_handler
 
     def read(self, script) -> np.ndarray:
-        value = script.split(":")
-        if len(value) == 1:
-            raise ValueError(f"Unsupported scripts address format {script}")
-        path, offset = ":".join(value[0:-1]), int(value[-1])
+        path, offset = parse_ark_address(script)
         fd = self._open(path, offset)
         return read_float_mat_vec(fd, direct_access=True)
 
@@ -72,3 +85,33 @@ class MatrixHolder(object):
     def __del__(self):
         for name in self.file_handle_dict:
             self.file_handle_dict[name].close()
+
+
+class MmapMatrixHolder(object):
+    """
+        Read (only) the matrices from read-only memory maps of the arks instead of seeking and reading the files,
+        the FM/DM/FV/DV matrices are read-only views of the map, so only the pages touched are read from the disk,
+        the compressed matrices are uncompressed as MatrixHolder.
+        Each ark is mapped once and shared by all its matrices, at most max_open_maps arks are kept mapped,
+        a dropped map is only unmapped when the last view of it is released
+    """
+    def __init__(self, max_open_maps=MMAP_POOL_SIZE):
+        assert max_open_maps > 0
+        self.max_open_maps = max_open_maps
+        self.map_dict = OrderedDict()
+
+    def _map(self, path):
+        if path in self.map_dict:
+            self.map_dict.move_to_end(path)
+            return self.map_dict[path]
+        with open(path, "rb") as fd:
+            ark_map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        self.map_dict[path] = ark_map
+        if len(self.map_dict) > self.max_open_maps:
+            # the views still read hold the map, it is not closed here
+            self.map_dict.popitem(last=False)
+        return ark_map
+
+    def read(self, script) -> np.ndarray:
+        path, offset = parse_ark_address(script)
+        return read_float_mat_vec_from_buffer(self._map(path), offset)
@@ -10,23 +10,46 @@ import time
 
 class ArchiveProvider(object):
 
-    def __init__(self, ark_path, split_num, feature_name="feature"):
+    def __init__(self, ark_path, split_num, feature_name="feature", shard_index=None):
+        """
+            shard_index: only provide the archive `{feature_name}_{shard_index + 1}.ark`,
+                so that each process writes its own shard of the split_num archives
+        """
         self.scp_list = list()
         self.split_num = split_num
-        if not os.path.exists(ark_path):
-            os.makedirs(ark_path)
+        os.makedirs(ark_path, exist_ok=True)
         self.ark_pool = [os.path.join(ark_path, f"{feature_name}_{i + 1}.ark") for i in range(split_num)]
+        if shard_index is not None:
+            assert 0 <= shard_index < split_num
+            self.ark_pool = [self.ark_pool[shard_index]]
         random.seed(time.time())
 
     def record(self, utt_id, utt_addr):
         self.scp_list.append((utt_id, utt_addr))
 
     def provide(self):
-        return self.ark_pool[random.randint(0, self.split_num - 1)]
+        return self.ark_pool[random.randint(0, len(self.ark_pool) - 1)]
 
     def save(self, scp_file):
         with open(scp_file, "w") as fw:
             for utt_id, utt_addr in self.scp_list:
                 fw.write(f"{utt_id} {utt_addr}\n")
             fw.flush()
-        print(f"Save to file scp_file {scp_file}")
\ No newline at end of file
+        print(f"Save to file scp_file {scp_file}")
+
+
+def merge_scp(scp_files, scp_file, remove=True):
+    """
+        Merge the scp fragments into one scp sorted by the utt_id
+    """
+    lines = list()
+    for fragment in scp_files:
+        with open(fragment, "r") as fr:
+            lines.extend(line for line in fr if line.strip())
+    lines.sort(key=lambda line: line.split(maxsplit=1)[0])
+    with open(scp_file, "w") as fw:
+        fw.writelines(lines)
+    if remove:
+        for fragment in scp_files:
+            os.remove(fragment)
+    print(f"Merge {len(scp_files)} scp files to {scp_file}")
@@ -16,9 +16,9 @@ from typing import Union, Dict, Callable
 import os
 import numpy as np
 
-from util.holder import WavHolder, SimpleTextHolder, MatrixHolder
+from util.holder import WavHolder, SimpleTextHolder, MatrixHolder, MmapMatrixHolder
 
-Holder = Union[WavHolder, SimpleTextHolder, MatrixHolder]
+Holder = Union[WavHolder, SimpleTextHolder, MatrixHolder, MmapMatrixHolder]
 
 __all__ = [
     "SequentialTableReader",  # "SequentialTableScriptReader", "SequentialTableArchiveReader"
@@ -63,9 +63,9 @@ class SequentialTableReader(object):
             else:
                 raise KeyError(f"Integer index out of range, {index} vs {len(self.scp_dict)}")
         elif type(index) == str:
-            if index not in self.index_keys:
+            if index not in self.scp_dict:
                 raise KeyError(f"Missing key {index}")
-        return self._load(index)
+        return self._load(self.scp_dict[index])
 
 
 # class SequentialTableArchiveReader(SequentialTableReader):